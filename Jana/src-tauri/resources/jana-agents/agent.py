@@ -1,9 +1,12 @@
+import asyncio
 import json
 import os
+import time
 import uuid
-from typing import List, Tuple
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
 from autogen_core import (
+    CancellationToken,
     FunctionCall,
     MessageContext,
     RoutedAgent,
@@ -15,6 +18,7 @@ from autogen_core import (
 from autogen_core.models import (
     AssistantMessage,
     ChatCompletionClient,
+    CreateResult,
     FunctionExecutionResult,
     FunctionExecutionResultMessage,
     LLMMessage,
@@ -23,9 +27,13 @@ from autogen_core.models import (
 )
 from autogen_core.tools import Tool
 from autogen_ext.models.openai import OpenAIChatCompletionClient
+from command_index import command_catalog, relevant_reference
+from context_budget import fit_messages
 from command_reference import http_command_reference, ssh_command_reference
 from dotenv import load_dotenv
 from jana_tools import (
+    CHAT_SESSION,
+    end_chat_session,
     execute_http_command_tool,
     execute_ssh_command_tool,
     log_into_switch_tool,
@@ -34,18 +42,50 @@ from jana_tools import (
     search_google_tool,
 )
 from pydantic import BaseModel
+from tokens import count_tokens, counts_are_exact
+from tool_executor import TOOL_EXECUTOR
 
 # Load environment variables from .env
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-FINAL_RESPONSE = ""
+# Seconds a chat may take before it is cancelled
+CHAT_TIMEOUT = float(os.getenv("JANA_CHAT_TIMEOUT", 300))
+# Prints the system prompt and context sizes of every model call
+PROMPT_DEBUG = os.getenv("JANA_PROMPT_DEBUG", "0") == "1"
+
+# Tools that only read, several of them in one model turn can run at the same time
+READ_ONLY_TOOLS = {"execute_http_command", "mac_address_lookup", "search_google"}
+
+# Totals over all turns that ran tools, sequential_s is how long the calls would have taken one by one
+TOOL_TURN_STATS = {"turns": 0, "calls": 0, "sequential_s": 0.0, "wall_clock_s": 0.0}
+
+# System prompt size over all switch admin calls, switch_admin_prompt_stats adds what the full
+# command reference would have cost
+PROMPT_STATS = {"calls": 0, "prompt_tokens": 0}
+
+# Prompt tokens over all model calls, as the full context would have been and as sent after fitting it to the budget
+CONTEXT_STATS = {"calls": 0, "full_prompt_tokens": 0, "sent_prompt_tokens": 0}
+
+# All chats share one instance of each agent, the session id in the messages tells them apart
+AGENT_KEY = "default"
+
+# Final answer of each running chat, keyed by its session id
+PENDING_RESULTS: Dict[str, asyncio.Future] = {}
+# Progress events (tokens, tool calls) of chats started with chat_stream(), keyed the same way
+EVENT_QUEUES: Dict[str, asyncio.Queue] = {}
+# Cancels the model calls and tools of a chat that timed out or whose client went away
+CANCELLATION_TOKENS: Dict[str, CancellationToken] = {}
+# Logouts of finished chats still running on the tool pool
+_CLEANUP_TASKS = set()
 
 
 class UserTask(BaseModel):
+    session_id: str
     context: List[LLMMessage]
 
 
 class AgentResponse(BaseModel):
+    session_id: str
     reply_to_topic: str
     context: List[LLMMessage]
 
@@ -54,7 +94,7 @@ class AIAgent(RoutedAgent):
     def __init__(
         self,
         description: str,
-        system_message: SystemMessage,
+        system_message: Union[SystemMessage, Callable[[List[LLMMessage]], SystemMessage]],
         model_client: ChatCompletionClient,
         tools: List[Tool],
         delegate_tools: List[Tool],
@@ -74,12 +114,123 @@ class AIAgent(RoutedAgent):
 
     @message_handler
     async def handle_task(self, message: UserTask, ctx: MessageContext) -> None:
-        # Send the user's message to the llm
-        llm_result = await self._model_client.create(
-            messages=[self._system_message] + message.context,
+        # The runtime only logs handler errors, so hand them to the waiting chat() as well
+        future = PENDING_RESULTS.get(message.session_id)
+        # Lets _emit, _call_model and the tools (through their threads) see which chat they work for
+        token = CHAT_SESSION.set(message.session_id)
+        try:
+            final_response = await self._complete_task(message, ctx)
+        except Exception as e:
+            if future is not None and not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            CHAT_SESSION.reset(token)
+        if final_response is not None and future is not None and not future.done():
+            future.set_result(final_response)
+
+    def _system_message_for(self, context: List[LLMMessage]) -> SystemMessage:
+        # A factory builds the system message from the conversation, e.g. to include only relevant reference
+        if isinstance(self._system_message, SystemMessage):
+            return self._system_message
+        return self._system_message(context)
+
+    def _emit(self, event: dict):
+        queue = EVENT_QUEUES.get(CHAT_SESSION.get())
+        if queue is not None:
+            queue.put_nowait(event)
+
+    async def _call_model(self, context: List[LLMMessage], ctx: MessageContext) -> CreateResult:
+        # The context itself keeps everything, only the copy sent to the model is fitted to the token budget
+        messages, full_tokens, sent_tokens = fit_messages(self._system_message_for(context), context)
+        CONTEXT_STATS["calls"] += 1
+        CONTEXT_STATS["full_prompt_tokens"] += full_tokens
+        CONTEXT_STATS["sent_prompt_tokens"] += sent_tokens
+        if PROMPT_DEBUG and sent_tokens < full_tokens:
+            print(
+                f"{'-' * 80}\n{self.id.type}:\nPrompt fitted to budget: {sent_tokens} tokens instead of "
+                f"{full_tokens} ({full_tokens - sent_tokens} saved, {len(context) + 1 - len(messages)} messages dropped)",
+                flush=True,
+            )
+        if CHAT_SESSION.get() not in EVENT_QUEUES:
+            return await self._model_client.create(
+                messages=messages,
+                tools=self._tool_schema + self._delegate_tool_schema,
+                cancellation_token=ctx.cancellation_token,
+            )
+        # Someone is listening, stream the text as it is generated; the last item is the full result.
+        # Tokens name their model turn, and turn_end tells whether the turn ended in tool calls, in
+        # which case its text was said on the way and is not part of the answer
+        turn = uuid.uuid4().hex
+        llm_result = None
+        async for chunk in self._model_client.create_stream(
+            messages=messages,
             tools=self._tool_schema + self._delegate_tool_schema,
             cancellation_token=ctx.cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                llm_result = chunk
+            elif chunk:
+                self._emit({"type": "token", "turn": turn, "text": chunk})
+        self._emit({
+            "type": "turn_end", "turn": turn,
+            "tool_calls": llm_result is not None and isinstance(llm_result.content, list),
+        })
+        return llm_result
+
+    async def _run_tool(
+        self, call: FunctionCall, ctx: MessageContext
+    ) -> Tuple[FunctionExecutionResult, float]:
+        started = time.perf_counter()
+        self._emit({"type": "tool_start", "call_id": call.id, "name": call.name, "arguments": call.arguments})
+        arguments = json.loads(call.arguments)  # Load the tool's args
+        result = await self._tools[call.name].run_json(arguments, ctx.cancellation_token)
+        result_as_str = self._tools[call.name].return_value_as_string(result)
+        self._emit({
+            "type": "tool_end", "call_id": call.id, "name": call.name,
+            "duration_ms": 1000 * (time.perf_counter() - started),
+        })
+        return (
+            FunctionExecutionResult(
+                call_id=call.id, content=result_as_str, is_error=False, name=call.name
+            ),
+            time.perf_counter() - started,
         )
+
+    async def _run_tool_calls(
+        self, calls: List[FunctionCall], ctx: MessageContext
+    ) -> List[FunctionExecutionResult]:
+        # Consecutive read-only calls run together, anything else waits for them and runs alone
+        # so logins, logouts and config changes keep the order the model gave them in
+        started = time.perf_counter()
+        timed: List[Tuple[FunctionExecutionResult, float]] = []
+        batch: List[FunctionCall] = []
+        for call in calls:
+            if call.name in READ_ONLY_TOOLS:
+                batch.append(call)
+                continue
+            timed.extend(await asyncio.gather(*(self._run_tool(c, ctx) for c in batch)))
+            batch = []
+            timed.append(await self._run_tool(call, ctx))
+        timed.extend(await asyncio.gather(*(self._run_tool(c, ctx) for c in batch)))
+
+        wall_clock = time.perf_counter() - started
+        sequential = sum(duration for _, duration in timed)
+        TOOL_TURN_STATS["turns"] += 1
+        TOOL_TURN_STATS["calls"] += len(calls)
+        TOOL_TURN_STATS["sequential_s"] += sequential
+        TOOL_TURN_STATS["wall_clock_s"] += wall_clock
+        if len(calls) > 1:
+            print(
+                f"{'-' * 80}\n{self.id.type}:\n{len(calls)} tool calls took {wall_clock:.2f}s, "
+                f"{sequential:.2f}s one after the other (saved {sequential - wall_clock:.2f}s)",
+                flush=True,
+            )
+        return [result for result, _ in timed]
+
+    async def _complete_task(self, message: UserTask, ctx: MessageContext) -> Optional[str]:
+        # Send the user's message to the llm
+        llm_result = await self._call_model(message.context, ctx)
         print(f"{'-' * 80}\n{self.id.type}:\n{llm_result.content}", flush=True)
 
         # Process the llm's result
@@ -88,26 +239,16 @@ class AIAgent(RoutedAgent):
         ):
             tool_call_results: List[FunctionExecutionResult] = []
             delegate_targets: List[Tuple[str, UserTask]] = []
-            # Process each function call
+            # Check every call first, so nothing runs when the model names an unknown tool
             for call in llm_result.content:
-                arguments = json.loads(call.arguments)  # Load the tool's args
-                if call.name in self._tools:
-                    # Execute the tool directly
-                    result = await self._tools[call.name].run_json(
-                        arguments, ctx.cancellation_token
-                    )
-                    result_as_str = self._tools[call.name].return_value_as_string(
-                        result
-                    )
-                    tool_call_results.append(
-                        FunctionExecutionResult(
-                            call_id=call.id,
-                            content=result_as_str,
-                            is_error=False,
-                            name=call.name,
-                        )
-                    )
-                elif call.name in self._delegate_tools:
+                if call.name not in self._tools and call.name not in self._delegate_tools:
+                    raise ValueError(f"Unknown tool: {call.name}")
+            tool_calls = [call for call in llm_result.content if call.name in self._tools]
+            if tool_calls:
+                tool_call_results = await self._run_tool_calls(tool_calls, ctx)
+            for call in llm_result.content:
+                if call.name in self._delegate_tools:
+                    arguments = json.loads(call.arguments)  # Load the tool's args
                     # Execute the tool to get the delegate agent's topic type
                     result = await self._delegate_tools[call.name].run_json(
                         arguments, ctx.cancellation_token
@@ -131,10 +272,8 @@ class AIAgent(RoutedAgent):
                         ),
                     ]
                     delegate_targets.append(
-                        (topic_type, UserTask(context=delegate_messages))
+                        (topic_type, UserTask(session_id=message.session_id, context=delegate_messages))
                     )
-                else:
-                    raise ValueError(f"Unknown tool: {call.name}")
             if len(delegate_targets) > 0:
                 # Delegate the task to other agents by publishing the messages to the topics
                 for topic_type, task in delegate_targets:
@@ -143,7 +282,7 @@ class AIAgent(RoutedAgent):
                         flush=True,
                     )
                     await self.publish_message(
-                        task, topic_id=TopicId(topic_type, self.id.key)
+                        task, topic_id=TopicId(topic_type, self.id.key), cancellation_token=ctx.cancellation_token
                     )
             if len(tool_call_results) > 0:
                 print(f"{'-' * 80}\n{self.id.type}:\n{tool_call_results}", flush=True)
@@ -156,25 +295,21 @@ class AIAgent(RoutedAgent):
                         FunctionExecutionResultMessage(content=tool_call_results),
                     ]
                 )
-                llm_result = await self._model_client.create(
-                    messages=[self._system_message] + message.context,
-                    tools=self._tool_schema + self._delegate_tool_schema,
-                    cancellation_token=ctx.cancellation_token,
-                )
+                llm_result = await self._call_model(message.context, ctx)
                 print(
                     f"{'-' * 80}\n{self.id.type}(llm call with results):\n{llm_result.content}",
                     flush=True,
                 )
             else:
-                return
+                # Delegated: the agent that took over resolves the result
+                return None
 
         # The tasks have been completed, publish the final result
         assert isinstance(llm_result.content, str)
         message.context.append(
             AssistantMessage(content=llm_result.content, source=self.id.type)
         )
-        global FINAL_RESPONSE
-        FINAL_RESPONSE = llm_result.content
+        return llm_result.content
 
 
 class UserAgent(RoutedAgent):
@@ -188,8 +323,9 @@ class UserAgent(RoutedAgent):
         self, message: AgentResponse, ctx: MessageContext
     ) -> None:
         await self.publish_message(
-            UserTask(context=message.context),
+            UserTask(session_id=message.session_id, context=message.context),
             topic_id=TopicId(self._agent_topic_type, source=self.id.key),
+            cancellation_token=ctx.cancellation_token,
         )
 
 
@@ -200,30 +336,8 @@ switch_admin_agent_topic_type = "SwitchAdminAgent"
 user_topic_type = "User"
 
 
-async def create_runtime():
-    runtime = SingleThreadedAgentRuntime()
-
-    model_client = OpenAIChatCompletionClient(
-        model="gpt-4o-mini", api_key=OPENAI_API_KEY
-    )
-
-    user_agent = await UserAgent.register(
-        runtime,
-        type=user_agent_topic_type,
-        factory=lambda: UserAgent(
-            description="Agent to handle the interaction with the user",
-            user_topic_type=user_topic_type,
-            agent_topic_type=switch_admin_agent_topic_type,
-        ),
-    )
-
-    switch_agent = await AIAgent.register(
-        runtime,
-        type=switch_admin_agent_topic_type,
-        factory=lambda: AIAgent(
-            "The switch admin that manages a physical switch",
-            system_message=SystemMessage(
-                content=f"""
+# The command reference is filled in per call with only the sections relevant to the task
+SWITCH_ADMIN_PROMPT = """
                 You are a network administrator for an Aruba 6300X switch. You can interact with the switch using either HTTP API commands or SSH commands.
 
                 You have access to five tools:
@@ -256,7 +370,8 @@ async def create_runtime():
 
                 3. **Command Reference**
                 • The following CLI commands are available over HTTP only:  
-                {http_command_reference}  
+                {http_commands}  
+                • The reference for the HTTP commands most relevant to this task is at the end of these instructions  
                 • These HTTP commands are *read-only*. They cannot modify switch configuration.  
                 • If a command is not listed above, it is not supported via HTTP and should be executed using SSH instead.
 
@@ -323,7 +438,95 @@ async def create_runtime():
 
                 Fix the user’s networking issue confidently and clearly, choosing the correct tool (HTTP or SSH) and validating every step. After the fix, clearly summarize the steps taken and results.
                 """
-            ),
+
+# Appended after the fixed prompt above, so every call starts with the same prefix and the
+# model provider's prompt cache still applies while the retrieved sections change
+SWITCH_ADMIN_REFERENCE = """
+                ====================
+                📘 Command reference for this task:
+                ====================
+
+                HTTP commands:
+                {http_reference}
+                """
+
+# The SSH reference is short and holds the only examples of the config format, so it is always
+# included, in the fixed part of the prompt
+SWITCH_ADMIN_PROMPT_PREFIX = SWITCH_ADMIN_PROMPT.format(
+    http_commands=command_catalog("http"), ssh_command_reference=ssh_command_reference
+)
+
+# Token count of the prompt with the full HTTP reference, see full_switch_admin_prompt_tokens
+_full_switch_admin_prompt_tokens: Optional[int] = None
+
+
+def full_switch_admin_prompt_tokens() -> int:
+    # What the prompt cost per call before the reference was retrieved, for the token report. Counted
+    # on first use rather than at import, since counting may have to download the encoding first
+    global _full_switch_admin_prompt_tokens
+    if _full_switch_admin_prompt_tokens is not None:
+        return _full_switch_admin_prompt_tokens
+    tokens = count_tokens(
+        SWITCH_ADMIN_PROMPT_PREFIX + SWITCH_ADMIN_REFERENCE.format(http_reference=http_command_reference)
+    )
+    if counts_are_exact():
+        # An estimate is not kept, the encoding may still load later
+        _full_switch_admin_prompt_tokens = tokens
+    return tokens
+
+
+def switch_admin_prompt_stats() -> dict:
+    return dict(PROMPT_STATS, full_prompt_tokens=PROMPT_STATS["calls"] * full_switch_admin_prompt_tokens())
+
+
+def retrieval_query(context: List[LLMMessage], recent_calls: int = 6) -> str:
+    # The latest user request plus the tools called since, so follow-up calls keep their reference
+    query = []
+    for message in reversed(context):
+        if isinstance(message, AssistantMessage) and isinstance(message.content, list):
+            query.extend(call.arguments for call in message.content if isinstance(call, FunctionCall))
+        elif isinstance(message, UserMessage):
+            query.append(str(message.content))
+            break
+    return " ".join(query[-recent_calls:] if len(query) > recent_calls else query)
+
+
+def switch_admin_system_message(context: List[LLMMessage]) -> SystemMessage:
+    content = SWITCH_ADMIN_PROMPT_PREFIX + SWITCH_ADMIN_REFERENCE.format(
+        http_reference=relevant_reference(retrieval_query(context))
+    )
+    tokens = count_tokens(content)
+    PROMPT_STATS["calls"] += 1
+    PROMPT_STATS["prompt_tokens"] += tokens
+    if PROMPT_DEBUG:
+        full_tokens = full_switch_admin_prompt_tokens()
+        print(
+            f"{'-' * 80}\n{switch_admin_agent_topic_type}:\nSystem prompt {tokens} tokens, "
+            f"{full_tokens} with the full command reference ({full_tokens - tokens} saved)",
+            flush=True,
+        )
+    return SystemMessage(content=content)
+
+
+async def create_runtime(model_client: ChatCompletionClient):
+    runtime = SingleThreadedAgentRuntime()
+
+    user_agent = await UserAgent.register(
+        runtime,
+        type=user_agent_topic_type,
+        factory=lambda: UserAgent(
+            description="Agent to handle the interaction with the user",
+            user_topic_type=user_topic_type,
+            agent_topic_type=switch_admin_agent_topic_type,
+        ),
+    )
+
+    switch_agent = await AIAgent.register(
+        runtime,
+        type=switch_admin_agent_topic_type,
+        factory=lambda: AIAgent(
+            "The switch admin that manages a physical switch",
+            system_message=switch_admin_system_message,
             model_client=model_client,
             tools=[
                 execute_http_command_tool,
@@ -352,20 +555,113 @@ async def create_runtime():
     return runtime
 
 
-async def chat(task: str, history: List[LLMMessage]):
-    agent_runtime = await create_runtime()
+# Created once by start_runtime() and reused by every chat
+AGENT_RUNTIME: Optional[SingleThreadedAgentRuntime] = None
+MODEL_CLIENT: Optional[ChatCompletionClient] = None
+
 
-    agent_runtime.start()
+async def start_runtime(model_client: Optional[ChatCompletionClient] = None):
+    global AGENT_RUNTIME, MODEL_CLIENT
+    if AGENT_RUNTIME is not None:
+        return
+    # One client for the whole process keeps its HTTP connection pool (and TLS sessions) warm
+    MODEL_CLIENT = model_client or OpenAIChatCompletionClient(
+        model="gpt-4o-mini", api_key=OPENAI_API_KEY
+    )
+    AGENT_RUNTIME = await create_runtime(MODEL_CLIENT)
+    # The message loop runs for the life of the process, chats run on it concurrently
+    AGENT_RUNTIME.start()
+
+
+async def stop_runtime():
+    global AGENT_RUNTIME, MODEL_CLIENT
+    if AGENT_RUNTIME is not None:
+        await AGENT_RUNTIME.stop()
+    if MODEL_CLIENT is not None:
+        await MODEL_CLIENT.close()
+    AGENT_RUNTIME = None
+    MODEL_CLIENT = None
+
+
+async def _start_chat(
+    task: str, history: List[LLMMessage], stream: bool = False
+) -> Tuple[str, asyncio.Future]:
+    if AGENT_RUNTIME is None:
+        await start_runtime()
+
+    # Each request gets its own session id, which every message of the chat carries
     ssid = str(uuid.uuid4())
+    PENDING_RESULTS[ssid] = asyncio.get_running_loop().create_future()
+    CANCELLATION_TOKENS[ssid] = CancellationToken()
+    if stream:
+        # The queue has to exist before the message is published, or the first tokens are missed
+        EVENT_QUEUES[ssid] = asyncio.Queue()
     user_input = task
-    await agent_runtime.publish_message(
+    await AGENT_RUNTIME.publish_message(
         AgentResponse(
+            session_id=ssid,
             context=history + [UserMessage(content=user_input, source="User")],
             reply_to_topic=user_topic_type,
         ),
-        topic_id=TopicId(user_topic_type, ssid),
+        topic_id=TopicId(user_topic_type, AGENT_KEY),
+        cancellation_token=CANCELLATION_TOKENS[ssid],
     )
-
-    await agent_runtime.stop_when_idle()
-
-    return FINAL_RESPONSE
+    return ssid, PENDING_RESULTS[ssid]
+
+
+def _end_chat(ssid: str):
+    PENDING_RESULTS.pop(ssid, None)
+    EVENT_QUEUES.pop(ssid, None)
+    # Stops whatever the agents are still doing for the chat, a no-op once it has finished
+    CANCELLATION_TOKENS.pop(ssid).cancel()
+    # The logout blocks on the network, so it runs on the tool pool without holding up the reply
+    task = asyncio.ensure_future(TOOL_EXECUTOR.run(end_chat_session, ssid))
+    _CLEANUP_TASKS.add(task)
+    task.add_done_callback(_CLEANUP_TASKS.discard)
+
+
+async def chat(task: str, history: List[LLMMessage], timeout: float = CHAT_TIMEOUT):
+    """
+    :raises asyncio.TimeoutError: if the chat takes longer than `timeout` seconds
+    """
+    ssid, result = await _start_chat(task, history)
+    try:
+        return await asyncio.wait_for(result, timeout)
+    finally:
+        _end_chat(ssid)
+
+
+async def chat_stream(
+    task: str, history: List[LLMMessage], timeout: float = CHAT_TIMEOUT
+) -> AsyncIterator[dict]:
+    """
+    Runs a chat and yields its progress as it happens: {"type": "token"} for model
+    text, {"type": "turn_end"} after each model turn (with "tool_calls" true when the
+    turn's text is not the answer), {"type": "tool_start"} / {"type": "tool_end"}
+    around each tool call, and finally {"type": "final"} with the answer (or
+    {"type": "error"}, also when the chat takes longer than `timeout` seconds).
+    """
+    ssid, result = await _start_chat(task, history, stream=True)
+    queue = EVENT_QUEUES[ssid]
+    deadline = asyncio.get_running_loop().time() + timeout
+    try:
+        while not result.done() or not queue.empty():
+            if not queue.empty():
+                yield queue.get_nowait()
+                continue
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                yield {"type": "error", "error": f"No answer within {timeout:g} seconds"}
+                return
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, result}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        if result.exception() is not None:
+            yield {"type": "error", "error": str(result.exception())}
+        else:
+            yield {"type": "final", "text": result.result()}
+    finally:
+        _end_chat(ssid)
@@ -1,4 +1,7 @@
+import asyncio
+import json
 import os
+from contextlib import asynccontextmanager
 from typing import List
 
 from autogen_core.models import (
@@ -8,17 +11,42 @@ from autogen_core.models import (
 )
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from agent import chat, switch_admin_agent_topic_type
+from agent import (
+    CONTEXT_STATS,
+    TOOL_TURN_STATS,
+    chat,
+    chat_stream,
+    start_runtime,
+    stop_runtime,
+    switch_admin_agent_topic_type,
+    switch_admin_prompt_stats,
+)
+from command_cache import COMMAND_CACHE
+from jana_tools import COMPACTION_STATS
+from tool_executor import LOOP_LAG_MONITOR, TOOL_EXECUTOR
 
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 8000))
 
 previous_response: List[LLMMessage] = []
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The agent runtime and model client are created once and shared by all requests
+    await start_runtime()
+    LOOP_LAG_MONITOR.start()
+    yield
+    await LOOP_LAG_MONITOR.stop()
+    await stop_runtime()
+    TOOL_EXECUTOR.shutdown()
+
+
 # Create the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,17 +61,26 @@ async def index():
     return {"message": "Jana is running"}
 
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "switch_tools": TOOL_EXECUTOR.stats(),
+        "event_loop": LOOP_LAG_MONITOR.stats(),
+        "tool_turns": dict(TOOL_TURN_STATS),
+        "switch_admin_prompt": switch_admin_prompt_stats(),
+        "context_budget": dict(CONTEXT_STATS),
+        "http_output_compaction": dict(COMPACTION_STATS),
+        "command_cache": COMMAND_CACHE.stats(),
+    }
+
+
 # Define a Pydantic model for the incoming request
 class TaskRequest(BaseModel):
     history: List[dict]
     task: str
 
-@app.post("/run_task")
-async def run_task_route(task_request: TaskRequest):
-    task = task_request.task
-    if not task:
-        print("No task provided")
-        raise HTTPException(status_code=400, detail="No task provided")
+
+def to_history(task_request: TaskRequest) -> List[LLMMessage]:
     history: List[LLMMessage] = []
     context = task_request.history
     for message in context:
@@ -51,13 +88,46 @@ async def run_task_route(task_request: TaskRequest):
             history.append(UserMessage(content=message["content"], source="user"))
         else:
             history.append(AssistantMessage(content=message["content"], source=switch_admin_agent_topic_type))
+    return history
+
+
+@app.post("/run_task")
+async def run_task_route(task_request: TaskRequest):
+    task = task_request.task
+    if not task:
+        print("No task provided")
+        raise HTTPException(status_code=400, detail="No task provided")
+    history = to_history(task_request)
     print(f"Running task: {task}")
 
 
-    response = await chat(task=task, history=history)
+    try:
+        response = await chat(task=task, history=history)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The agent did not answer in time")
     return response
 
 
+@app.post("/run_task_stream")
+async def run_task_stream_route(task_request: TaskRequest):
+    # Same as /run_task, but the progress is sent as Server-Sent Events:
+    # token, tool_start, tool_end and finally final (or error)
+    task = task_request.task
+    if not task:
+        print("No task provided")
+        raise HTTPException(status_code=400, detail="No task provided")
+    history = to_history(task_request)
+    print(f"Running task (streaming): {task}")
+
+    async def events():
+        async for event in chat_stream(task=task, history=history):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
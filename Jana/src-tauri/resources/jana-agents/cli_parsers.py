@@ -0,0 +1,350 @@
+"""
+Parsers that turn AOS-CX show command output into compact records for the LLM.
+
+The switch pads its output into fixed-width tables and repeats the same block for
+every port, which costs a lot of tokens while saying little. The parsers keep the
+values, drop the padding, leave out all-zero counters and fold runs of ports that
+look the same into one record ("1/1/2..1/1/24").
+"""
+
+import base64
+import json
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+SEPARATOR = re.compile(r"^\s*-{3,}(\s+-{3,})*\s*$")
+# The lookahead keeps times ("23:02:14") from being read as a key and a value
+KEY_VALUE = re.compile(r"^\s*([A-Za-z][^:]{0,60}?)\s*:(?!\d{2}\b)\s*(.*)$")
+INTERFACE_HEADER = re.compile(r"^\s*(?:Interface|Aggregate)\s+(\S+)\s+is\s+(.+?)\s*$")
+STP_PORT_HEADER = re.compile(r"^\s*Port\s+(\S+)\s*$")
+# Interfaces, LAGs, VLANs and similar numbered names, which are the only rows that get folded
+PORT_NAME = re.compile(r"^[a-z]*\d+(/\d+)*$", re.IGNORECASE)
+COUNTER = re.compile(r"^\s*([A-Za-z][\w ()/-]*?)\s*:?\s*(\d+)\s*$")
+EMPTY_VALUES = {"", "--", "-", "—"}
+ZERO = re.compile(r"^(0+(\.0+)?|n/a)$", re.IGNORECASE)
+# Fields that may differ between ports that are otherwise the same; they do not stop ports from
+# being folded together, but are kept per port when they differ
+PER_PORT_FIELDS = {"Hardware", "MAC Address", "Link state", "Link transitions", "Description", "Designated port"}
+TOP_PROCESSES = 10
+
+Item = Union[str, Dict[str, str], Dict[str, list]]
+
+
+def unwrap_cli_response(text: str) -> str:
+    """
+    The REST /cli endpoint answers with JSON holding the output under "result" or
+    "result_base64_encoded", depending on the firmware. Plain text is returned as is.
+    """
+    try:
+        payload = json.loads(text)
+    except (TypeError, ValueError):
+        return text
+    if not isinstance(payload, dict):
+        return text
+    if payload.get("result_base64_encoded"):
+        return base64.b64decode(payload["result_base64_encoded"]).decode("utf-8", errors="replace")
+    if isinstance(payload.get("result"), str):
+        return payload["result"]
+    return text
+
+
+def clean(value: str) -> str:
+    value = " ".join(value.split())
+    return "" if value in EMPTY_VALUES else value
+
+
+def is_zero(value: str) -> bool:
+    return value == "" or bool(ZERO.match(value.replace(",", "")))
+
+
+def _column_starts(header_lines: List[str], separator: str, rows: List[str]) -> List[int]:
+    segments = [m.start() for m in re.finditer(r"-+", separator)]
+    if len(segments) > 1:
+        # "---- ------ ----" underlines each column
+        return segments
+    starts = sorted({m.start() for line in header_lines[:1] for m in re.finditer(r"\S+", line)})
+    # A header word is only a column start if no value in the rows runs across it
+    return [
+        start for start in starts
+        if start == starts[0] or not any(
+            len(row) > start and row[start - 1] != " " and row[start] != " " for row in rows
+        )
+    ]
+
+
+def parse_table(header_lines: List[str], separator: str, rows: List[str]) -> Dict[str, list]:
+    starts = _column_starts(header_lines, separator, rows)
+    bounds = list(zip(starts, starts[1:] + [None]))
+    columns = [clean(" ".join(line[start:end] for line in header_lines)) for start, end in bounds]
+    parsed = []
+    for row in rows:
+        values = row.split()
+        if len(values) != len(columns):
+            values = [row[start:end] for start, end in bounds]
+        parsed.append([clean(value) for value in values])
+
+    # Words of a multi-word header that got a column of their own belong to the column before
+    keep = []
+    for index, column in enumerate(columns):
+        if index and keep and all(not row[index] for row in parsed):
+            columns[keep[-1]] = f"{columns[keep[-1]]} {column}".strip()
+        else:
+            keep.append(index)
+    return {
+        "columns": [columns[i] for i in keep],
+        "rows": [[row[i] for i in keep] for row in parsed],
+    }
+
+
+def fold_rows(table: Dict[str, list]) -> Dict[str, list]:
+    # Consecutive ports whose other columns are the same become one row for the whole run
+    folded = []
+    run_start = None
+    for row in table["rows"]:
+        if folded and row[1:] and row[1:] == folded[-1][1:] and PORT_NAME.match(row[0]) and run_start:
+            folded[-1][0] = f"{run_start}..{row[0]}"
+        else:
+            run_start = row[0] if PORT_NAME.match(row[0]) else None
+            folded.append(list(row))
+    return {"columns": table["columns"], "rows": folded}
+
+
+def parse_sections(text: str) -> List[Item]:
+    """
+    Splits show output into tables ({"columns", "rows"}), runs of "key: value" lines
+    (a dict) and any remaining lines (strings), in output order.
+    """
+    lines = [line.rstrip() for line in text.splitlines()]
+    items: List[Item] = []
+    pending: List[str] = []
+
+    def flush(lines_to_flush):
+        pairs: Dict[str, str] = {}
+        for line in lines_to_flush:
+            # Several pairs can share a line, "Hello time:2  Max Age:20"
+            matches = [KEY_VALUE.match(part) for part in re.split(r"\s{2,}", line.strip())]
+            if not all(matches):
+                matches = [KEY_VALUE.match(line)]
+            if all(matches):
+                pairs.update((clean(m.group(1)), clean(m.group(2))) for m in matches)
+                continue
+            if pairs:
+                items.append(pairs)
+                pairs = {}
+            if clean(line):
+                items.append(clean(line))
+        if pairs:
+            items.append(pairs)
+
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        if not SEPARATOR.match(line):
+            if line.strip():
+                pending.append(line)
+            else:
+                flush(pending)
+                pending = []
+            index += 1
+            continue
+
+        # Header is the text right above the separator, or between a top border and this separator
+        header = pending[-2:]
+        flush(pending[:-2])
+        pending = []
+        index += 1
+        rows = []
+        while index < len(lines) and lines[index].strip() and not SEPARATOR.match(lines[index]):
+            rows.append(lines[index])
+            index += 1
+        if not header and index < len(lines) and SEPARATOR.match(lines[index]):
+            # That was a top border, what followed it is the header
+            header = rows
+            separator = lines[index]
+            index += 1
+            rows = []
+            while index < len(lines) and lines[index].strip() and not SEPARATOR.match(lines[index]):
+                rows.append(lines[index])
+                index += 1
+        else:
+            separator = line
+        if index < len(lines) and SEPARATOR.match(lines[index]):
+            index += 1  # bottom border
+        if header:
+            items.append(fold_rows(parse_table(header, separator, rows)))
+        else:
+            flush(rows)
+    flush(pending)
+    return items
+
+
+def nonzero_rows(table: Dict[str, list]) -> Dict[str, list]:
+    # Counter tables: keep only the counters that have counted something
+    return {row[0]: row[1:] for row in table["rows"] if not all(is_zero(value) for value in row[1:])}
+
+
+def _fold_records(records: List[dict], key: str) -> List[dict]:
+    """
+    Folds runs of consecutive records whose fields other than PER_PORT_FIELDS match
+    into one record. Per-port fields that are the same for the whole run stay on the
+    record; the ones that differ are kept for every port under "ports", so nothing is lost.
+    """
+    runs: List[List[dict]] = []
+    for record in records:
+        shared = {k: v for k, v in record.items() if k != key and k not in PER_PORT_FIELDS}
+        previous = runs[-1][-1] if runs else None
+        if previous is not None and shared == {
+            k: v for k, v in previous.items() if k != key and k not in PER_PORT_FIELDS
+        }:
+            runs[-1].append(record)
+        else:
+            runs.append([record])
+
+    folded = []
+    for run in runs:
+        if len(run) == 1:
+            folded.append(run[0])
+            continue
+        record = {k: v for k, v in run[0].items() if k not in PER_PORT_FIELDS}
+        record[key] = f"{run[0][key]}..{run[-1][key]}"
+        fields = [field for field in PER_PORT_FIELDS if any(field in r for r in run)]
+        ports: Dict[str, dict] = {}
+        for field in sorted(fields):
+            values = [r.get(field) for r in run]
+            if all(value == values[0] for value in values):
+                record[field] = values[0]
+            else:
+                for r, value in zip(run, values):
+                    if value is not None:
+                        ports.setdefault(r[key], {})[field] = value
+        if ports:
+            record["ports"] = ports
+        folded.append(record)
+    return folded
+
+
+def parse_interface(text: str) -> List[dict]:
+    """
+    `show interface`: one record per interface with its settings, the flags printed
+    as bare lines ("Full-duplex", "MTU 1500") and only the non-zero rate and counter rows.
+    """
+    blocks = []
+    for line in text.splitlines():
+        header = INTERFACE_HEADER.match(line)
+        if header:
+            blocks.append(({"interface": header.group(1), "status": header.group(2)}, []))
+        elif blocks:
+            blocks[-1][1].append(line)
+
+    records = []
+    for record, body in blocks:
+        flags = []
+        for item in parse_sections("\n".join(body)):
+            if isinstance(item, str):
+                flags.append(item)
+            elif "columns" in item:
+                counters = nonzero_rows(item)
+                if counters:
+                    record[item["columns"][0] or "counters"] = counters
+            else:
+                record.update(item)
+        if flags:
+            record["flags"] = flags
+        records.append(record)
+    return _fold_records(records, "interface")
+
+
+def parse_resource_utilization(text: str) -> List[Item]:
+    """
+    `show system resource-utilization`: the system totals, and of the per-process
+    table only the busiest processes.
+    """
+    items = []
+    for item in parse_sections(text):
+        if isinstance(item, dict) and "columns" in item and len(item["columns"]) > 1:
+            rows = [row for row in item["rows"] if not all(is_zero(value) for value in row[1:])]
+
+            def load(row):
+                return tuple(float(v) if re.match(r"^\d+(\.\d+)?$", v) else 0.0 for v in row[1:])
+
+            rows.sort(key=load, reverse=True)
+            item = {"columns": item["columns"], "rows": rows[:TOP_PROCESSES]}
+            omitted = len(rows) - len(item["rows"])
+            if omitted:
+                item["omitted"] = [f"{omitted} more processes with lower usage"]
+        items.append(item)
+    return items
+
+
+def parse_spanning_tree(text: str) -> List[Item]:
+    """
+    `show spanning-tree [mst] detail`: the instance summary and port table as parsed,
+    the per-port detail blocks without their zero counters, identical ports folded together.
+    """
+    lines = text.splitlines()
+    first_port = next((i for i, line in enumerate(lines) if STP_PORT_HEADER.match(line)), len(lines))
+    items = parse_sections("\n".join(lines[:first_port]))
+
+    ports = []
+    for line in lines[first_port:]:
+        header = STP_PORT_HEADER.match(line)
+        if header:
+            ports.append({"port": header.group(1)})
+        elif ports and line.strip():
+            # Counter lines like "Bpdus sent 12, received 0" become one entry per counter
+            counters = [COUNTER.match(part) for part in line.split(",")]
+            if all(counters):
+                first = counters[0].group(1).split()[0]
+                for match in counters:
+                    name = match.group(1) if match is counters[0] else f"{first} {match.group(1)}"
+                    if not is_zero(match.group(2)):
+                        ports[-1][clean(name)] = match.group(2)
+                continue
+            for item in parse_sections(line):
+                if isinstance(item, dict) and "columns" not in item:
+                    ports[-1].update({k: v for k, v in item.items() if not is_zero(v)})
+                elif isinstance(item, str):
+                    ports[-1].setdefault("flags", []).append(item)
+    items.extend(_fold_records(ports, "port"))
+    return items
+
+
+# Commands with a parser, matched against the whole (normalized) command; anything else is returned as is
+PARSERS: List[Tuple[re.Pattern, Callable[[str], list]]] = [
+    (re.compile(r"show interface brief"), parse_sections),
+    (re.compile(r"show interface( [a-z]*\d[\w/.-]*)?"), parse_interface),
+    (re.compile(r"show system resource-utilization"), parse_resource_utilization),
+    (re.compile(r"show spanning-tree( mst)? detail"), parse_spanning_tree),
+    (re.compile(r"show vlan"), parse_sections),
+]
+
+
+def parser_for(command: str) -> Optional[Callable[[str], list]]:
+    command = " ".join(command.split()).lower()
+    for pattern, parser in PARSERS:
+        if pattern.fullmatch(command):
+            return parser
+    return None
+
+
+def compact_cli_output(command: str, raw: Optional[str]) -> Optional[str]:
+    """
+    :param command: The show command that produced the output
+    :param raw: What cli_command returned
+    :return: Compact JSON of the parsed output, or the output itself if the command has
+        no parser or its output could not be parsed
+    """
+    if raw is None:
+        return None
+    parser = parser_for(command)
+    if parser is None:
+        return raw
+    text = unwrap_cli_response(raw)
+    try:
+        parsed = parser(text)
+    except Exception as e:
+        print(f"Could not parse output of {command}:", str(e))
+        return text
+    if not parsed:
+        return text.strip()
+    return json.dumps(parsed[0] if len(parsed) == 1 else parsed, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,148 @@
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Optional, Tuple
+
+from cli_parsers import unwrap_cli_response
+
+COMMAND_CACHE_ENABLED = os.getenv("JANA_COMMAND_CACHE", "1") != "0"
+
+# (class, command prefixes, TTL in seconds), the first class with a matching prefix wins,
+# so more specific prefixes ("show interface brief") come before shorter ones ("show interface")
+COMMAND_CLASSES = [
+    ("live", ("show clock", "show uptime"), 0),
+    ("static", ("show version", "show system inventory", "show boot-history", "show capacities",
+                "show module", "show vsf topology"), 3600),
+    ("config", ("show running-config", "show vlan", "show ip dns", "show vrf", "show ntp", "show lldp local",
+                "show dhcp", "show tacacs-server", "show aaa"), 300),
+    ("state", ("show interface brief", "show interface lag", "show lldp", "show mac-address-table",
+               "show spanning-tree", "show vsf", "show ip route", "show arp"), 30),
+    ("counters", ("show interface", "show system resource-utilization", "show environment",
+                  "show resources", "show copp-policy statistics"), 5),
+]
+DEFAULT_CLASS = ("other", 10)
+MAX_ENTRIES = 256
+
+# The switch reports a bad command on a line starting with "%" ("% Invalid input detected", "% Unknown
+# command", "% Ambiguous command") while /cli still answers 200
+CLI_ERROR = re.compile(r"^\s*% ", re.MULTILINE)
+
+# SSH commands that only read; anything else may change the configuration
+READ_ONLY_SSH = re.compile(r"^\s*(show|ping|ping6|traceroute|traceroute6)\b", re.IGNORECASE)
+
+
+def normalize(command: str) -> str:
+    return " ".join(command.split()).lower()
+
+
+def command_class(command: str) -> Tuple[str, int]:
+    """
+    :return: (class name, TTL in seconds) for a CLI command
+    """
+    command = normalize(command)
+    for name, prefixes, ttl in COMMAND_CLASSES:
+        if any(command == prefix or command.startswith(prefix + " ") for prefix in prefixes):
+            return name, ttl
+    return DEFAULT_CLASS
+
+
+def is_cli_error(output: str) -> bool:
+    return bool(CLI_ERROR.search(unwrap_cli_response(output)))
+
+
+def changes_config(ssh_command: str) -> bool:
+    # The agent writes multi-line ssh commands with real or escaped newlines
+    lines = [line for line in re.split(r"\\n|\n", ssh_command) if line.strip()]
+    return any(not READ_ONLY_SSH.match(line) for line in lines)
+
+
+class CommandCache:
+    """
+    Per-switch cache of CLI command output. Each command lives for the TTL of its
+    class in COMMAND_CLASSES; a class with TTL 0 is never cached, and neither is output
+    holding a CLI error. `invalidate` drops everything cached for a switch, for use
+    around a configuration change.
+
+    A read that was already running when the switch was invalidated may return output
+    from before the change. Callers take `generation` before running the command and
+    pass it to `put`, which drops the output if the switch was invalidated since.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # (switch, command) -> (expires at, command class, output)
+        self._generations = Counter()  # switch -> invalidations so far
+        self._hits = Counter()
+        self._misses = Counter()
+        self._invalidations = 0
+        self._errors_not_cached = 0
+        self._stale_not_cached = 0
+
+    def get(self, switch_ip: str, command: str) -> Optional[str]:
+        key = (switch_ip, normalize(command))
+        name, _ = command_class(command)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._hits[name] += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+            self._misses[name] += 1
+            return None
+
+    def generation(self, switch_ip: str) -> int:
+        with self._lock:
+            return self._generations[switch_ip]
+
+    def put(self, switch_ip: str, command: str, output: Optional[str], generation: Optional[int] = None):
+        name, ttl = command_class(command)
+        if output is None or ttl <= 0:
+            return
+        if is_cli_error(output):
+            # A mistyped command should fail again when retried, not come back from the cache
+            with self._lock:
+                self._errors_not_cached += 1
+            return
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != self._generations[switch_ip]:
+                # The command started before an invalidation, its output may predate the change
+                self._stale_not_cached += 1
+                return
+            if len(self._entries) >= self._max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                while len(self._entries) >= self._max_entries:
+                    # Still full, drop whatever expires first
+                    del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+            self._entries[(switch_ip, normalize(command))] = (now + ttl, name, output)
+
+    def invalidate(self, switch_ip: str):
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if k[0] != switch_ip}
+            self._generations[switch_ip] += 1
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            hits, misses = sum(self._hits.values()), sum(self._misses.values())
+            return {
+                "enabled": COMMAND_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "invalidations": self._invalidations,
+                "errors_not_cached": self._errors_not_cached,
+                "stale_not_cached": self._stale_not_cached,
+                "by_class": {
+                    name: {"ttl_s": ttl, "hits": self._hits[name], "misses": self._misses[name]}
+                    for name, ttl in [(n, t) for n, _, t in COMMAND_CLASSES] + [DEFAULT_CLASS]
+                },
+            }
+
+
+COMMAND_CACHE = CommandCache()
@@ -0,0 +1,105 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from command_reference import http_command_reference
+
+# HTTP reference sections handed to the model per call, 0 puts the whole HTTP reference in the prompt.
+# The SSH reference is short and its few examples are the only ones of the config format, so it is
+# always included whole and not indexed
+REFERENCE_TOP_K = int(os.getenv("JANA_REFERENCE_TOP_K", 3))
+
+HTTP_SECTION = re.compile(r"^\s*# 📘 Command: `([^`]+)`", re.MULTILINE)
+TOKEN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "the", "this", "to", "what", "with", "you", "your",
+}
+
+
+class CommandSection:
+    def __init__(self, name: str, kind: str, text: str):
+        self.name = name
+        self.kind = kind  # "http"
+        self.text = text
+
+    def __repr__(self):
+        return f"CommandSection({self.kind}: {self.name})"
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def split_sections(reference: str, heading: re.Pattern, kind: str) -> List[CommandSection]:
+    matches = list(heading.finditer(reference))
+    sections = []
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        end = next_match.start() if next_match else len(reference)
+        sections.append(CommandSection(match.group(1).strip(), kind, reference[match.start():end].strip()))
+    return sections
+
+
+class CommandIndex:
+    """
+    BM25 index over the command reference, one document per command.
+
+    The command name is counted again on top of the section text, so a query naming a
+    command ranks that command's section above sections that only mention it.
+    """
+
+    def __init__(self, sections: List[CommandSection], k1: float = 1.5, b: float = 0.75):
+        self.sections = sections
+        self._k1 = k1
+        self._b = b
+        self._term_counts = [Counter(tokenize(f"{s.name} {s.name} {s.text}")) for s in sections]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        document_frequency = Counter(term for counts in self._term_counts for term in counts)
+        count = len(sections)
+        self._idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def search(self, query: str, k: int, kind: Optional[str] = None) -> List[Tuple[float, CommandSection]]:
+        """
+        :param query: Free text, e.g. the user's task and the commands run so far
+        :param k: Most sections to return
+        :param kind: Only return sections of this kind
+        :return: (score, section) pairs, best first, sections that share no term with the query are left out
+        """
+        terms = tokenize(query)
+        scored = []
+        for section, counts, length in zip(self.sections, self._term_counts, self._lengths):
+            if kind is not None and section.kind != kind:
+                continue
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term, 0)
+                if frequency:
+                    norm = self._k1 * (1 - self._b + self._b * length / self._average_length)
+                    score += self._idf[term] * frequency * (self._k1 + 1) / (frequency + norm)
+            if score > 0:
+                scored.append((score, section))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored[:k]
+
+
+COMMAND_INDEX = CommandIndex(split_sections(http_command_reference, HTTP_SECTION, "http"))
+
+
+def command_catalog(kind: str) -> str:
+    # Names only, so the model still knows every command exists when its section is not included
+    return ", ".join(f"`{s.name}`" for s in COMMAND_INDEX.sections if s.kind == kind)
+
+
+def relevant_reference(query: str, k: int = REFERENCE_TOP_K) -> str:
+    """
+    :return: HTTP reference holding only the top k sections for the query
+    """
+    if k <= 0:
+        return http_command_reference
+    return "\n\n".join(s.text for _, s in COMMAND_INDEX.search(query, k, "http")) or "(no section matched this task)"
@@ -0,0 +1,101 @@
+"""
+Checks that overlapping chats each get their own answer.
+
+A fake model client answers every task with the task text after a random delay, so
+the chats finish in a different order than they started. Each chat must get back
+exactly the answer for its own task. With --stream the chats go through
+chat_stream() and the streamed tokens have to add up to that answer as well.
+
+    python concurrency-test.py --chats 50
+    python concurrency-test.py --chats 50 --stream
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from autogen_core.models import ChatCompletionClient, CreateResult, ModelInfo, RequestUsage, UserMessage
+
+import agent
+
+
+class EchoModelClient(ChatCompletionClient):
+    def __init__(self, max_delay):
+        self._max_delay = max_delay
+
+    async def create(self, messages, *, tools=[], tool_choice="auto", json_output=None, extra_create_args={},
+                     cancellation_token=None):
+        task = [m for m in messages if isinstance(m, UserMessage)][-1].content
+        await asyncio.sleep(random.uniform(0, self._max_delay))
+        return CreateResult(finish_reason="stop", content=f"answer to {task}",
+                            usage=RequestUsage(prompt_tokens=0, completion_tokens=0), cached=False)
+
+    async def create_stream(self, messages, *, tools=[], tool_choice="auto", json_output=None, extra_create_args={},
+                            cancellation_token=None):
+        result = await self.create(messages, tools=tools, cancellation_token=cancellation_token)
+        for word in result.content.split(" "):
+            yield word + " "
+        yield result
+
+    async def close(self):
+        pass
+
+    def actual_usage(self):
+        return RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def total_usage(self):
+        return RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def count_tokens(self, messages, *, tools=[]):
+        return 0
+
+    def remaining_tokens(self, messages, *, tools=[]):
+        return 0
+
+    @property
+    def capabilities(self):
+        return self.model_info
+
+    @property
+    def model_info(self):
+        return ModelInfo(vision=False, function_calling=True, json_output=False, family="unknown",
+                         structured_output=False)
+
+
+async def streamed_chat(task):
+    tokens = []
+    async for event in agent.chat_stream(task=task, history=[]):
+        if event["type"] == "token":
+            tokens.append(event["text"])
+        elif event["type"] == "final":
+            # Tokens from another chat would make the two disagree
+            return event["text"] if "".join(tokens).strip() == event["text"] else "".join(tokens)
+    return None
+
+
+async def main(chats, max_delay, stream):
+    await agent.start_runtime(EchoModelClient(max_delay))
+    try:
+        tasks = [f"task {i}" for i in range(chats)]
+        run = streamed_chat if stream else lambda task: agent.chat(task=task, history=[])
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(run(task) for task in tasks))
+        elapsed = time.perf_counter() - started
+    finally:
+        await agent.stop_runtime()
+
+    mixed_up = [(task, answer) for task, answer in zip(tasks, answers) if answer != f"answer to {task}"]
+    for task, answer in mixed_up:
+        print(f"{task!r} got {answer!r}")
+    print(f"{chats} concurrent chats in {elapsed:.2f}s (max model delay {max_delay}s), {len(mixed_up)} mixed up")
+    print(f"Pending results left: {len(agent.PENDING_RESULTS)}, event queues left: {len(agent.EVENT_QUEUES)}")
+    assert not mixed_up and not agent.PENDING_RESULTS and not agent.EVENT_QUEUES
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--max-delay", type=float, default=0.5)
+    parser.add_argument("--stream", action="store_true", help="Run the chats through chat_stream()")
+    args = parser.parse_args()
+    asyncio.run(main(args.chats, args.max_delay, args.stream))
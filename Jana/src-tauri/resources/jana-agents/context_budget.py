@@ -0,0 +1,121 @@
+import os
+from typing import List, Tuple
+
+from autogen_core import FunctionCall
+from autogen_core.models import (
+    FunctionExecutionResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    UserMessage,
+)
+
+from tokens import count_tokens
+
+# Most tokens sent to the model per call, system message included
+CONTEXT_TOKEN_BUDGET = int(os.getenv("JANA_CONTEXT_TOKEN_BUDGET", 12000))
+# User turns at the end of the conversation that are only shortened last; the latest turn
+# is always kept, so 0 behaves like 1
+KEEP_RECENT_TURNS = int(os.getenv("JANA_CONTEXT_KEEP_RECENT_TURNS", 2))
+# Characters of an elided tool output that stay in the context
+ELIDED_OUTPUT_CHARS = 200
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message: LLMMessage) -> int:
+    content = message.content
+    if isinstance(content, str):
+        text = content
+    elif isinstance(message, FunctionExecutionResultMessage):
+        text = " ".join(result.content for result in content)
+    else:
+        text = " ".join(
+            f"{part.name} {part.arguments}" if isinstance(part, FunctionCall) else str(part) for part in content
+        )
+    return count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _elide(message: FunctionExecutionResultMessage) -> FunctionExecutionResultMessage:
+    results = []
+    for result in message.content:
+        content = result.content
+        if len(content) > ELIDED_OUTPUT_CHARS:
+            content = (
+                f"{content[:ELIDED_OUTPUT_CHARS]}... [output of {result.name} shortened from "
+                f"{len(result.content)} characters, run it again if the details are needed]"
+            )
+        results.append(
+            FunctionExecutionResult(call_id=result.call_id, content=content, is_error=result.is_error, name=result.name)
+        )
+    return FunctionExecutionResultMessage(content=results)
+
+
+def _turn_starts(context: List[LLMMessage]) -> List[int]:
+    starts = [i for i, message in enumerate(context) if isinstance(message, UserMessage)]
+    return starts if starts and starts[0] == 0 else [0] + starts
+
+
+def fit_to_budget(
+    context: List[LLMMessage], budget: int, keep_recent_turns: int = KEEP_RECENT_TURNS
+) -> Tuple[List[LLMMessage], int, int]:
+    """
+    Shortens a conversation to at most `budget` tokens, in this order:
+
+    1. Tool outputs before the last `keep_recent_turns` user turns are cut to a short
+       head, oldest first.
+    2. Whole turns before those are dropped, oldest first. A turn runs from a user
+       message to the next one, so tool calls always leave together with their results.
+    3. Tool outputs of the recent turns are cut too, except the latest one.
+
+    The recent turns are never dropped, only shortened, so the result can still be
+    over budget.
+
+    :return: (shortened context, tokens before, tokens after)
+    """
+    tokens = [message_tokens(message) for message in context]
+    before = total = sum(tokens)
+    if total <= budget:
+        return context, before, total
+
+    context = list(context)
+    starts = _turn_starts(context)
+    keep = max(1, keep_recent_turns)
+    recent_start = starts[-keep] if len(starts) >= keep else starts[0]
+
+    def elide_outputs(indices):
+        nonlocal total
+        for i in indices:
+            if total <= budget:
+                return
+            if isinstance(context[i], FunctionExecutionResultMessage):
+                context[i] = _elide(context[i])
+                shortened = message_tokens(context[i])
+                total -= tokens[i] - shortened
+                tokens[i] = shortened
+
+    elide_outputs(range(recent_start))
+
+    dropped = 0
+    for start, end in zip(starts, starts[1:]):
+        if total <= budget or end > recent_start:
+            break
+        total -= sum(tokens[start:end])
+        dropped = end
+
+    context, tokens, recent_start = context[dropped:], tokens[dropped:], recent_start - dropped
+    last_output = max(
+        (i for i, message in enumerate(context) if isinstance(message, FunctionExecutionResultMessage)), default=None
+    )
+    elide_outputs(i for i in range(recent_start, len(context)) if i != last_output)
+    return context, before, total
+
+
+def fit_messages(
+    system_message: LLMMessage, context: List[LLMMessage], budget: int = CONTEXT_TOKEN_BUDGET
+) -> Tuple[List[LLMMessage], int, int]:
+    """
+    :return: (messages to send, prompt tokens of the full context, prompt tokens sent)
+    """
+    system_tokens = message_tokens(system_message)
+    fitted, before, after = fit_to_budget(context, max(0, budget - system_tokens))
+    return [system_message] + fitted, system_tokens + before, system_tokens + after
@@ -2,7 +2,14 @@ from autogen_core.tools import FunctionTool
 import RESTapi_CX as SwitchApi
 from tavily import TavilyClient
 from dotenv import load_dotenv
+from tool_executor import offloaded
+from cli_parsers import compact_cli_output, parser_for
+from command_cache import COMMAND_CACHE, COMMAND_CACHE_ENABLED, changes_config
+from tokens import count_tokens
 import os
+import threading
+from contextvars import ContextVar
+from typing import Dict
 
 load_dotenv()
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
@@ -10,67 +17,114 @@ DEFAULT_SWITCH_IP = "10.0.150.150"
 DEFAULT_USERNAME = "admin"
 DEFAULT_PASSWORD = ""
 
-SESSION_COOKIE: any = None
+# Id of the chat a tool runs for; set by the agent and carried into the tool threads
+CHAT_SESSION: ContextVar[str] = ContextVar("chat_session", default="")
+# Switch session cookie of each chat, so concurrent chats do not log each other out
+SESSION_COOKIES: Dict[str, any] = {}
+
+# Tokens of the raw http command output against what was handed to the model after compacting
+COMPACTION_STATS = {"commands": 0, "raw_tokens": 0, "compact_tokens": 0}
+COMPACTION_LOCK = threading.Lock()
+
+# The tools below block on the network, each FunctionTool runs them through offloaded()
+# so they execute on the bounded switch tool pool instead of the event loop
 
 
 # Function Tools
 def log_into_switch():
-    global SESSION_COOKIE
     result = SwitchApi.login_to_switch(
         switch_ip=DEFAULT_SWITCH_IP,
         username=DEFAULT_USERNAME,
         password=DEFAULT_PASSWORD,
     )
-    SESSION_COOKIE = result
+    SESSION_COOKIES[CHAT_SESSION.get()] = result
     return result
 
 
 log_into_switch_tool = FunctionTool(
-    log_into_switch,
+    offloaded(log_into_switch),
     description="Logs into the switch and saves the session cookie. MUST be called before any other switch action.",
 )
 
 
 def log_out_switch():
     result = SwitchApi.logout_from_switch(
-        switch_ip=DEFAULT_SWITCH_IP, session=SESSION_COOKIE
+        switch_ip=DEFAULT_SWITCH_IP, session=SESSION_COOKIES.pop(CHAT_SESSION.get(), None)
     )
     return result
 
 
 log_out_switch_tool = FunctionTool(
-    log_out_switch,
+    offloaded(log_out_switch),
     description="Logs out of the switch. MUST be called after all switch actions are finished.",
 )
 
 
-def execute_http_command(command: str):
-    if SESSION_COOKIE is None:
+def end_chat_session(chat_session: str):
+    # Logs out a switch session the chat left open, e.g. because it timed out before the model did
+    session = SESSION_COOKIES.pop(chat_session, None)
+    if session is not None:
+        try:
+            SwitchApi.logout_from_switch(switch_ip=DEFAULT_SWITCH_IP, session=session)
+        except Exception as e:
+            print("Could not log out a finished chat's switch session:", str(e))
+
+
+def execute_http_command(command: str, compact: bool = True):
+    session = SESSION_COOKIES.get(CHAT_SESSION.get())
+    if session is None:
         return "Not logged into switch"
-    result = SwitchApi.cli_command(
-        switch_ip=DEFAULT_SWITCH_IP, session=SESSION_COOKIE, command=command
-    )
-    return result
+    result = COMMAND_CACHE.get(DEFAULT_SWITCH_IP, command) if COMMAND_CACHE_ENABLED else None
+    if result is None:
+        # Taken before the request, so output read across a config change is not cached
+        generation = COMMAND_CACHE.generation(DEFAULT_SWITCH_IP)
+        result = SwitchApi.cli_command(
+            switch_ip=DEFAULT_SWITCH_IP, session=session, command=command
+        )
+        if COMMAND_CACHE_ENABLED:
+            COMMAND_CACHE.put(DEFAULT_SWITCH_IP, command, result, generation=generation)
+    if not compact or result is None or parser_for(command) is None:
+        return result
+    compacted = compact_cli_output(command, result)
+    raw_tokens, compact_tokens = count_tokens(result), count_tokens(compacted)
+    with COMPACTION_LOCK:
+        COMPACTION_STATS["commands"] += 1
+        COMPACTION_STATS["raw_tokens"] += raw_tokens
+        COMPACTION_STATS["compact_tokens"] += compact_tokens
+    print(f"{command}: output compacted from {raw_tokens} to {compact_tokens} tokens", flush=True)
+    return compacted
 
 
 execute_http_command_tool = FunctionTool(
-    execute_http_command,
-    description="Write a custom command for the switch to be executed via http. Use given command reference to write commands.",
+    offloaded(execute_http_command),
+    description="Write a custom command for the switch to be executed via http. Use given command reference to write commands. "
+    "The output of show interface, show interface brief, show vlan, show system resource-utilization and show spanning-tree detail "
+    "comes back parsed into compact JSON (ports that are otherwise the same are grouped as 1/1/2..1/1/24 with their differing fields "
+    "under ports, all-zero counters are left out); set compact to false only if you need the raw text.",
 )
 
 
 def execute_ssh_command(command: str):
-    result = SwitchApi.ssh_command(
-        switch_ip=DEFAULT_SWITCH_IP,
-        username=DEFAULT_USERNAME,
-        password=DEFAULT_PASSWORD,
-        command=command,
-    )
+    config_change = changes_config(command)
+    if config_change:
+        # Nothing read before the change may be served once it starts
+        COMMAND_CACHE.invalidate(DEFAULT_SWITCH_IP)
+    try:
+        result = SwitchApi.ssh_command(
+            switch_ip=DEFAULT_SWITCH_IP,
+            username=DEFAULT_USERNAME,
+            password=DEFAULT_PASSWORD,
+            command=command,
+        )
+    finally:
+        if config_change:
+            # And nothing a read running alongside it cached in the meantime, whether or not the command succeeded
+            COMMAND_CACHE.invalidate(DEFAULT_SWITCH_IP)
     return result
 
 
 execute_ssh_command_tool = FunctionTool(
-    execute_ssh_command,
+    offloaded(execute_ssh_command),
     description="Write a custom command for the switch to be executed via ssh. use prior knowledge to write commands.",
 )
 
@@ -81,7 +135,7 @@ def search_google(query: str):
 
 
 search_google_tool = FunctionTool(
-    search_google,
+    offloaded(search_google),
     description="Searches Google using Tavily. Provide a query string to get search results.",
 )
 
@@ -90,7 +144,7 @@ def mac_address_lookup(mac_address: str):
     import requests
 
     url = f"https://www.macvendorlookup.com/api/v2/{mac_address}"
-    response = requests.get(url)
+    response = requests.get(url, timeout=SwitchApi.TIMEOUT)
     if response.status_code == 200:
         data = response.json()
         return data
@@ -98,5 +152,5 @@ def mac_address_lookup(mac_address: str):
 
 
 mac_address_lookup_tool = FunctionTool(
-    mac_address_lookup, description="A tool to find the manufacturer of a mac address."
+    offloaded(mac_address_lookup), description="A tool to find the manufacturer of a mac address."
 )
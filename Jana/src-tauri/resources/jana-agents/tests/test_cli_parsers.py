@@ -0,0 +1,117 @@
+import json
+import os
+
+from cli_parsers import (
+    compact_cli_output,
+    parse_interface,
+    parse_resource_utilization,
+    parse_sections,
+    parse_spanning_tree,
+    parser_for,
+)
+from tokens import count_tokens
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def by_key(records, key):
+    return {record[key]: record for record in records if isinstance(record, dict) and key in record}
+
+
+def test_interface_keeps_differing_per_port_fields():
+    records = by_key(parse_interface(fixture("show_interface.txt")), "interface")
+
+    assert set(records) == {"1/1/1", "1/1/2..1/1/24"}
+    folded = records["1/1/2..1/1/24"]
+    assert folded["ports"]["1/1/2"]["Link transitions"] == "0"
+    assert folded["ports"]["1/1/3"]["Link transitions"] == "57"
+    assert folded["ports"]["1/1/3"]["Description"] == "flapping port"
+    assert folded["ports"]["1/1/2"]["Description"] == ""
+    # Differing values are only kept per port, not on the folded record
+    assert "Link transitions" not in folded
+    # Identical settings stay on the folded record once
+    assert "Admin state is up" in folded["flags"]
+    assert folded["VLAN Mode"] == "access"
+    assert folded["status"] == "down"
+
+
+def test_interface_keeps_only_nonzero_counters():
+    up = by_key(parse_interface(fixture("show_interface.txt")), "interface")["1/1/1"]
+
+    assert up["Link transitions"] == "5"
+    assert up["Description"] == "JANA Management Port VLAN1"
+    assert up["Statistic"]["Errors"] == ["3", "0", "3"]
+    assert "Dropped" not in up["Statistic"]
+    assert "Full-duplex" in up["flags"]
+
+
+def test_interface_brief_folds_identical_ports_only():
+    tables = [item for item in parse_sections(fixture("show_interface_brief.txt")) if "columns" in item]
+    ports = [row[0] for row in tables[0]["rows"]]
+
+    # 1/1/3 has a description of its own, so it splits the run of down ports
+    assert ports[:5] == ["1/1/1", "1/1/2", "1/1/3", "1/1/4..1/1/24", "1/1/25..1/1/26"]
+    assert tables[0]["rows"][2][-1] == "flapping port"
+    assert ports[-1] == "vlan1"
+
+
+def test_resource_utilization_keeps_busiest_processes():
+    items = parse_resource_utilization(fixture("show_system_resource_utilization.txt"))
+    totals = next(item for item in items if isinstance(item, dict) and "CPU usage(%)" in item)
+    table = next(item for item in items if isinstance(item, dict) and "columns" in item)
+
+    assert totals["Memory usage(%)"] == "29"
+    assert len(table["rows"]) == 10
+    assert table["rows"][0][0] == "hpe-routing"
+    assert table["omitted"] == ["5 more processes with lower usage"]
+
+
+def test_spanning_tree_folds_idle_ports():
+    items = parse_spanning_tree(fixture("show_spanning_tree_detail.txt"))
+    ports = by_key(items, "port")
+
+    assert set(ports) == {"1/1/1", "1/1/2..1/1/24"}
+    assert ports["1/1/1"]["Bpdus sent"] == "50000"
+    assert "Bpdus received" not in ports["1/1/1"]
+    assert ports["1/1/2..1/1/24"]["ports"]["1/1/7"]["Designated port"] == "7"
+
+
+def test_vlan_table():
+    table = next(item for item in parse_sections(fixture("show_vlan.txt")) if "columns" in item)
+
+    assert table["columns"][:3] == ["VLAN", "Name", "Status"]
+    assert table["rows"][1][:2] == ["10", "cameras"]
+    assert table["rows"][2][-1] == ""
+
+
+def test_commands_without_a_parser_are_returned_raw():
+    raw = fixture("show_running_config.json")
+
+    assert parser_for("show running-config") is None
+    assert compact_cli_output("show running-config", raw) == raw
+    assert compact_cli_output("show  Running-Config", raw) == raw
+
+
+def test_parser_selection():
+    assert parser_for("show interface brief") is parse_sections
+    assert parser_for("show interface") is parse_interface
+    assert parser_for("show interface 1/1/3") is parse_interface
+    assert parser_for("show interface lag1") is parse_interface
+    assert parser_for("show spanning-tree mst detail") is parse_spanning_tree
+    assert parser_for("show interface transceiver") is None
+    assert parser_for("show spanning-tree") is None
+
+
+def test_compaction_unwraps_the_rest_response_and_saves_tokens():
+    text = fixture("show_interface.txt")
+    raw = json.dumps({"cmd": "show interface", "result": text})
+    compact = compact_cli_output("show interface", raw)
+
+    parsed = json.loads(compact)
+    assert by_key(parsed, "interface")["1/1/2..1/1/24"]["ports"]["1/1/3"]["Description"] == "flapping port"
+    assert count_tokens(compact) * 5 < count_tokens(text)
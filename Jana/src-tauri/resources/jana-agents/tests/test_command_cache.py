@@ -0,0 +1,70 @@
+import json
+
+from command_cache import CommandCache, changes_config, command_class, is_cli_error
+
+
+def cli_response(result):
+    return json.dumps({"cmd": "show vlan", "result": result})
+
+
+def test_output_is_cached_per_switch_and_command():
+    cache = CommandCache()
+    cache.put("10.0.0.1", "show vlan", cli_response("VLAN  Name\n1     DEFAULT_VLAN_1\n"))
+
+    assert cache.get("10.0.0.1", "show  VLAN") is not None
+    assert cache.get("10.0.0.2", "show vlan") is None
+
+
+def test_cli_errors_are_not_cached():
+    cache = CommandCache()
+    for error in ("% Invalid input detected at '^' marker.", "% Unknown command.", "% Ambiguous command."):
+        cache.put("10.0.0.1", "show vlan", cli_response(f"\n{error}\n"))
+
+    assert cache.get("10.0.0.1", "show vlan") is None
+    assert cache.stats()["errors_not_cached"] == 3
+
+
+def test_percent_inside_output_is_not_an_error():
+    assert not is_cli_error(cli_response("CPU usage(%): 3\nMemory usage(%): 29\n"))
+    assert is_cli_error("  % Invalid input detected at '^' marker.")
+
+
+def test_live_commands_are_never_cached():
+    cache = CommandCache()
+    cache.put("10.0.0.1", "show clock", "Fri Mar 21 23:02:14 UTC 2025")
+
+    assert command_class("show clock") == ("live", 0)
+    assert cache.get("10.0.0.1", "show clock") is None
+
+
+def test_invalidate_drops_only_that_switch():
+    cache = CommandCache()
+    cache.put("10.0.0.1", "show vlan", "vlans")
+    cache.put("10.0.0.2", "show vlan", "vlans")
+    cache.invalidate("10.0.0.1")
+
+    assert cache.get("10.0.0.1", "show vlan") is None
+    assert cache.get("10.0.0.2", "show vlan") == "vlans"
+
+
+def test_changes_config():
+    assert not changes_config("show running-config")
+    assert not changes_config("ping 8.8.8.8\\nshow ip dns")
+    assert changes_config("config\\ninterface 1/1/3\\nshutdown")
+
+
+def test_read_started_before_an_invalidation_is_not_cached():
+    cache = CommandCache()
+    # A read starts, a config change invalidates the switch, then the read returns
+    generation = cache.generation("10.0.0.1")
+    other = cache.generation("10.0.0.2")
+    cache.invalidate("10.0.0.1")
+    cache.put("10.0.0.1", "show vlan", "vlans before the change", generation=generation)
+    cache.put("10.0.0.2", "show vlan", "vlans", generation=other)
+
+    assert cache.get("10.0.0.1", "show vlan") is None
+    assert cache.get("10.0.0.2", "show vlan") == "vlans"
+    assert cache.stats()["stale_not_cached"] == 1
+
+    cache.put("10.0.0.1", "show vlan", "vlans after the change", generation=cache.generation("10.0.0.1"))
+    assert cache.get("10.0.0.1", "show vlan") == "vlans after the change"
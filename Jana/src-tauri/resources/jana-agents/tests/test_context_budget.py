@@ -0,0 +1,148 @@
+from autogen_core import FunctionCall
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResult,
+    FunctionExecutionResultMessage,
+    SystemMessage,
+    UserMessage,
+)
+
+from context_budget import ELIDED_OUTPUT_CHARS, fit_messages, fit_to_budget, message_tokens
+
+OUTPUT = "interface 1/1/1 is up " * 200
+
+
+def turn(index, tool_calls=2, output=OUTPUT):
+    # A user request, the tool calls the model made for it, their results and the answer
+    calls = [
+        FunctionCall(id=f"{index}-{n}", name="execute_http_command", arguments='{"command": "show interface"}')
+        for n in range(tool_calls)
+    ]
+    return [
+        UserMessage(content=f"question {index}", source="user"),
+        AssistantMessage(content=calls, source="SwitchAdminAgent"),
+        FunctionExecutionResultMessage(content=[
+            FunctionExecutionResult(call_id=call.id, content=output, is_error=False, name=call.name) for call in calls
+        ]),
+        AssistantMessage(content=f"answer {index}", source="SwitchAdminAgent"),
+    ]
+
+
+def conversation(turns):
+    return [message for index in range(turns) for message in turn(index)]
+
+
+def total(context):
+    return sum(message_tokens(message) for message in context)
+
+
+def outputs(message):
+    return [result.content for result in message.content]
+
+
+def assert_paired(context):
+    # Every tool call has its result and every result its call, in the same order
+    pending = []
+    for message in context:
+        if isinstance(message, AssistantMessage) and isinstance(message.content, list):
+            assert not pending
+            pending = [call.id for call in message.content]
+        elif isinstance(message, FunctionExecutionResultMessage):
+            assert [result.call_id for result in message.content] == pending
+            pending = []
+    assert not pending
+
+
+def test_under_budget_is_unchanged():
+    context = conversation(3)
+    fitted, before, after = fit_to_budget(context, total(context))
+
+    assert fitted is context
+    assert before == after == total(context)
+
+
+def test_old_outputs_are_shortened_before_turns_are_dropped():
+    context = conversation(4)
+    # Room for everything once the outputs of the first two turns are shortened
+    budget = total(context) - message_tokens(context[2]) - message_tokens(context[6]) // 2
+    fitted, before, after = fit_to_budget(context, budget, keep_recent_turns=2)
+
+    assert len(fitted) == len(context)
+    assert after <= budget < before
+    assert all(len(output) < len(OUTPUT) for output in outputs(fitted[2]) + outputs(fitted[6]))
+    assert all(output.startswith(OUTPUT[:ELIDED_OUTPUT_CHARS]) for output in outputs(fitted[2]))
+    # The recent turns are untouched
+    assert outputs(fitted[10]) == outputs(fitted[14]) == [OUTPUT, OUTPUT]
+    assert_paired(fitted)
+
+
+def test_whole_turns_are_dropped_oldest_first_with_their_tool_calls():
+    context = conversation(6)
+    # The two recent turns and a little more
+    budget = 2 * total(turn(0)) + 100
+    fitted, _, after = fit_to_budget(context, budget, keep_recent_turns=2)
+
+    assert after <= budget
+    assert isinstance(fitted[0], UserMessage)
+    kept = [message.content for message in fitted if isinstance(message, UserMessage)]
+    assert kept[-2:] == ["question 4", "question 5"]
+    assert kept == [f"question {index}" for index in range(6 - len(kept), 6)]
+    assert_paired(fitted)
+
+
+def test_every_function_call_keeps_its_result():
+    context = conversation(8)
+    for budget in range(500, total(context), 500):
+        fitted, _, _ = fit_to_budget(context, budget, keep_recent_turns=2)
+        assert_paired(fitted)
+
+
+def test_recent_outputs_are_shortened_last_except_the_latest():
+    context = conversation(2)
+    fitted, _, after = fit_to_budget(context, total(turn(0)), keep_recent_turns=2)
+
+    assert len(fitted) == len(context)
+    assert all(len(output) < len(OUTPUT) for output in outputs(fitted[2]))
+    assert outputs(fitted[6]) == [OUTPUT, OUTPUT]
+
+
+def test_keep_zero_recent_turns_behaves_like_one():
+    context = conversation(4)
+    budget = total(turn(0)) + 100
+    zero, _, _ = fit_to_budget(context, budget, keep_recent_turns=0)
+    one, _, _ = fit_to_budget(context, budget, keep_recent_turns=1)
+
+    assert zero == one
+    assert zero[0].content == "question 3"
+    assert_paired(zero)
+
+
+def test_recent_turns_are_never_dropped():
+    context = conversation(3)
+    fitted, _, after = fit_to_budget(context, 10, keep_recent_turns=2)
+
+    assert after > 10
+    assert [m.content for m in fitted if isinstance(m, UserMessage)] == ["question 1", "question 2"]
+    assert_paired(fitted)
+
+
+def test_last_turn_over_budget_is_kept_whole():
+    context = conversation(3)
+    fitted, _, after = fit_to_budget(context, 10, keep_recent_turns=1)
+
+    assert after > 10
+    assert fitted[0].content == "question 2"
+    assert len(fitted) == 4
+    # The output the model is about to read is never shortened
+    assert outputs(fitted[2]) == [OUTPUT, OUTPUT]
+
+
+def test_system_message_counts_against_the_budget():
+    system = SystemMessage(content="You are a network administrator. " * 100)
+    context = conversation(4)
+    messages, before, after = fit_messages(system, context, budget=total(context))
+
+    assert messages[0] is system
+    assert before == message_tokens(system) + total(context)
+    assert after <= total(context)
+    assert_paired(messages[1:])
@@ -0,0 +1,33 @@
+import tokens
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def test_failed_encoding_load_is_retried(monkeypatch):
+    encoding = WordEncoding()
+    calls = []
+
+    def get_encoding(name):
+        calls.append(name)
+        if len(calls) == 1:
+            raise OSError("offline")
+        return encoding
+
+    now = [1000.0]
+    monkeypatch.setattr(tokens, "_loaded_encoding", None)
+    monkeypatch.setattr(tokens, "_failed_at", None)
+    monkeypatch.setattr(tokens.tiktoken, "get_encoding", get_encoding)
+    monkeypatch.setattr(tokens.time, "monotonic", lambda: now[0])
+
+    assert not tokens.counts_are_exact()
+    assert tokens.count_tokens("show interface brief") == (len("show interface brief") + 3) // 4
+    # No new attempt until the retry interval has passed
+    assert len(calls) == 1
+
+    now[0] += tokens.ENCODING_RETRY_S
+    assert tokens.counts_are_exact()
+    assert tokens.count_tokens("show interface brief") == 3
+    assert len(calls) == 2
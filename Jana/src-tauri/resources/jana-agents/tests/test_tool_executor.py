@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+from tool_executor import ToolExecutor
+
+
+def test_call_cancelled_while_queued_leaves_the_queue():
+    async def main():
+        executor = ToolExecutor(max_workers=1)
+        release = threading.Event()
+        busy = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        # The only thread is taken, so this call waits in the queue until it is cancelled
+        waiting = asyncio.ensure_future(executor.run(lambda: "never runs"))
+        await asyncio.sleep(0.05)
+        assert executor.stats()["queued"] == 1
+
+        waiting.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        await busy
+        executor.shutdown()
+        return executor.stats()
+
+    stats = asyncio.run(main())
+    assert stats["queued"] == 0
+    assert stats["active"] == 0
+    assert stats["completed"] == 1
@@ -0,0 +1,68 @@
+"""
+Token counting with the encoding of the OpenAI models the agents use.
+
+tiktoken downloads the encoding the first time it is used. The file is kept in
+TIKTOKEN_CACHE_DIR (tiktoken_cache/ next to this module unless set), so fetch it
+ahead of time, e.g. while building the image:
+
+    python tokens.py
+"""
+import os
+import sys
+import threading
+import time
+
+# tiktoken reads the variable when the encoding is loaded, so this has to be set before the first count
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktoken_cache"))
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Encoding used by gpt-4o and gpt-4o-mini
+ENCODING_NAME = "o200k_base"
+# Seconds to estimate counts after the encoding failed to load, before trying again
+ENCODING_RETRY_S = 60
+
+_encoding_lock = threading.Lock()
+_loaded_encoding = None
+_failed_at = None
+
+
+def _encoding():
+    global _loaded_encoding, _failed_at
+    if _loaded_encoding is not None or tiktoken is None:
+        return _loaded_encoding
+    if _failed_at is not None and time.monotonic() - _failed_at < ENCODING_RETRY_S:
+        return None
+    with _encoding_lock:
+        if _loaded_encoding is None:
+            try:
+                _loaded_encoding = tiktoken.get_encoding(ENCODING_NAME)
+            except Exception as e:
+                # Not cached yet and the download failed, e.g. offline
+                _failed_at = time.monotonic()
+                print(f"Could not load {ENCODING_NAME}, estimating token counts for now:", str(e))
+    return _loaded_encoding
+
+
+def counts_are_exact() -> bool:
+    # False while count_tokens falls back to the estimate
+    return _encoding() is not None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+if __name__ == "__main__":
+    # Fails loudly, so a build that could not cache the encoding does not ship without it
+    if tiktoken is None:
+        sys.exit("tiktoken is not installed")
+    tiktoken.get_encoding(ENCODING_NAME)
+    print(f"{ENCODING_NAME} cached in {os.environ['TIKTOKEN_CACHE_DIR']}")
@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import functools
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Switch calls block on the network for up to their timeout, so they get their own
+# bounded pool instead of sharing the loop's default executor with everything else
+SWITCH_TOOL_WORKERS = int(os.getenv("SWITCH_TOOL_WORKERS", 8))
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    values = sorted(values)
+
+    def pick(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+class ToolExecutor:
+    """
+    Bounded thread pool that runs the blocking switch tools (requests/paramiko) off the
+    event loop. At most `max_workers` tools run at once; extra calls wait for a thread.
+    """
+
+    def __init__(self, max_workers, window=1000):
+        self._max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="switch-tool")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._completed = 0
+        self._failed = 0
+        self._waits = deque(maxlen=window)
+        self._durations = deque(maxlen=window)
+
+    async def run(self, func, *args, **kwargs):
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._waits.append(started - submitted)
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                    self._failed += failed
+                    self._durations.append(time.perf_counter() - started)
+
+        # Context variables (the chat a tool runs for) do not cross into executor threads by themselves
+        context = contextvars.copy_context()
+        try:
+            future = self._pool.submit(context.run, call)
+        except RuntimeError:
+            # Shut down
+            self._leave_queue()
+            raise
+        future.add_done_callback(self._forget_if_cancelled)
+        # Cancelling the awaiting task cancels the call too, if no thread has picked it up yet
+        return await asyncio.wrap_future(future)
+
+    def _forget_if_cancelled(self, future):
+        # A call cancelled before it started never runs call(), which would have taken it off the queue
+        if future.cancelled():
+            self._leave_queue()
+
+    def _leave_queue(self):
+        with self._lock:
+            self._queued -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self._max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "queue_wait_ms": {k: 1000 * v for k, v in _percentiles(list(self._waits)).items()},
+                "duration_ms": {k: 1000 * v for k, v in _percentiles(list(self._durations)).items()},
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+TOOL_EXECUTOR = ToolExecutor(SWITCH_TOOL_WORKERS)
+
+
+def offloaded(func):
+    """
+    Turns a blocking tool function into a coroutine that runs it on TOOL_EXECUTOR.
+    The signature is kept, so FunctionTool builds the same schema for it.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await TOOL_EXECUTOR.run(func, *args, **kwargs)
+
+    return wrapper
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: a task sleeps for `interval` seconds and records how much
+    later than that it actually woke up. Anything blocking the loop shows up as lag.
+    """
+
+    def __init__(self, interval=0.1, window=600):
+        self._interval = interval
+        self._lags = deque(maxlen=window)
+        self._max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self._interval)
+            lag = max(0.0, loop.time() - started - self._interval)
+            self._lags.append(lag)
+            self._max_lag = max(self._max_lag, lag)
+
+    def stats(self):
+        lags = list(self._lags)
+        return {
+            "interval_ms": 1000 * self._interval,
+            "samples": len(lags),
+            "mean_lag_ms": 1000 * statistics.fmean(lags) if lags else 0.0,
+            "lag_ms": {k: 1000 * v for k, v in _percentiles(lags).items()},
+            "max_lag_ms": 1000 * self._max_lag,
+        }
+
+
+LOOP_LAG_MONITOR = LoopLagMonitor()
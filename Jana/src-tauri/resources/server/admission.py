@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class AdmissionController:
+    """
+    Bounded admission for one endpoint: at most `max_concurrent` requests run, at most
+    `max_queue` more wait for a slot, and everything beyond that is rejected.
+
+    A queued request that does not get a slot within `queue_timeout` seconds is
+    rejected as well, so admitted requests never wait longer than that and their
+    latency stays predictable under overload.
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, window=1000):
+        self.name = name
+        self._max_concurrent = max_concurrent
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected_full = 0
+        self._rejected_timeout = 0
+        self._waits = deque(maxlen=window)
+        self._service_times = deque(maxlen=window)
+
+    def acquire(self):
+        """
+        Waits for a slot.
+
+        :return: Admission timestamp to pass to `release`, or None if the request is rejected
+        """
+        arrived = time.perf_counter()
+        with self._cond:
+            if self._active >= self._max_concurrent:
+                if self._waiting >= self._max_queue:
+                    self._rejected_full += 1
+                    return None
+                self._waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self._active < self._max_concurrent, self._queue_timeout)
+                finally:
+                    self._waiting -= 1
+                if not admitted:
+                    self._rejected_timeout += 1
+                    return None
+            self._active += 1
+            self._admitted += 1
+            now = time.perf_counter()
+            self._waits.append(now - arrived)
+            return now
+
+    def release(self, admitted_at):
+        with self._cond:
+            self._active -= 1
+            self._service_times.append(time.perf_counter() - admitted_at)
+            self._cond.notify()
+
+    def retry_after(self):
+        # Rough time for the current queue to drain, in whole seconds
+        with self._cond:
+            service = float(np.mean(self._service_times)) if self._service_times else 1.0
+            return max(1, int(np.ceil(service * (self._waiting + 1) / self._max_concurrent)))
+
+    def stats(self):
+        with self._cond:
+            waits = list(self._waits)
+            p50, p95, p99 = np.percentile(waits, [50, 95, 99]) if waits else (0.0, 0.0, 0.0)
+            return {
+                "max_concurrent": self._max_concurrent,
+                "max_queue": self._max_queue,
+                "queue_timeout_s": self._queue_timeout,
+                "active": self._active,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "rejected_queue_full": self._rejected_full,
+                "rejected_queue_timeout": self._rejected_timeout,
+                "queue_wait_ms": {"p50": float(1000 * p50), "p95": float(1000 * p95), "p99": float(1000 * p99)},
+            }
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, controller):
+        super().__init__(f"Server busy, too many {controller.name} requests")
+        self.retry_after = controller.retry_after()
+
+
+class AdmissionSlot:
+    """
+    One request's slot with an AdmissionController, for requests that only need it
+    for some of their stages: `acquire` before a stage of work and `release` while
+    waiting on something else, so the wait does not keep other requests out.
+
+    Both are no-ops when the slot is already held or already free.
+    """
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._admitted_at = None
+
+    def acquire(self):
+        """
+        :raises AdmissionRejected: if no slot frees up in time
+        """
+        if self._admitted_at is None:
+            admitted_at = self._controller.acquire()
+            if admitted_at is None:
+                raise AdmissionRejected(self._controller)
+            self._admitted_at = admitted_at
+
+    def release(self):
+        if self._admitted_at is not None:
+            self._controller.release(self._admitted_at)
+            self._admitted_at = None
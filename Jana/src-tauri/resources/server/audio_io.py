@@ -0,0 +1,314 @@
+import io
+import struct
+import subprocess
+
+import numpy as np
+import soundfile as sf
+
+
+# Placeholder size used in streamed WAV headers, players treat it as "until EOF"
+STREAM_SIZE = 0xFFFFFFFF
+WHISPER_SAMPLE_RATE = 16000
+
+# Zero crossings of the anti-alias filter on each side, more gives a sharper cutoff
+LOWPASS_ZERO_CROSSINGS = 16
+
+# Output formats for synthesized speech, all encoded in memory by libsndfile
+AUDIO_FORMATS = {
+    "wav": {"mimetype": "audio/wav", "format": "WAV", "subtype": "PCM_16"},
+    "flac": {"mimetype": "audio/flac", "format": "FLAC", "subtype": "PCM_16"},
+    "opus": {"mimetype": "audio/ogg; codecs=opus", "format": "OGG", "subtype": "OPUS"},
+}
+
+
+class AudioDecoderMissing(Exception):
+    """The upload needs ffmpeg to be decoded, and ffmpeg is not installed."""
+
+
+def float_to_pcm16(samples):
+    """
+    Converts float samples in [-1, 1] to little-endian 16-bit PCM bytes.
+
+    :param samples: NumPy array of float samples
+    :return: PCM16 bytes
+    """
+    samples = np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0)
+    return (samples * 32767.0).astype("<i2").tobytes()
+
+
+def trim_silence(samples, threshold=1e-3):
+    """
+    Strips leading and trailing near-silent samples.
+
+    :param samples: NumPy array of float samples
+    :param threshold: Absolute amplitude below which a sample counts as silence
+    :return: View of `samples` without the silent edges
+    """
+    voiced = np.flatnonzero(np.abs(samples) > threshold)
+    if len(voiced) == 0:
+        return samples[:0]
+    return samples[voiced[0]:voiced[-1] + 1]
+
+
+def wav_stream_header(sample_rate, channels=1, bits_per_sample=16):
+    """
+    Builds a RIFF/WAVE header for PCM audio whose total length is not known yet.
+
+    :param sample_rate: Sample rate of the audio that follows
+    :param channels: Number of interleaved channels
+    :param bits_per_sample: Sample width in bits
+    :return: Header bytes, to be followed by raw PCM chunks
+    """
+    block_align = channels * bits_per_sample // 8
+    byte_rate = sample_rate * block_align
+    return (
+        b"RIFF" + struct.pack("<I", STREAM_SIZE) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                byte_rate, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", STREAM_SIZE)
+    )
+
+
+def lowpass_taps(cutoff):
+    """
+    Windowed-sinc (Blackman) low-pass filter taps.
+
+    :param cutoff: Cutoff frequency as a fraction of the sample rate (0 < cutoff < 0.5)
+    :return: Odd-length NumPy array of taps, normalized to unity gain
+    """
+    half = int(np.ceil(LOWPASS_ZERO_CROSSINGS / (2 * cutoff)))
+    n = np.arange(-half, half + 1)
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(len(n))
+    return taps / taps.sum()
+
+
+def lowpass(audio, cutoff):
+    """
+    Windowed-sinc (Blackman) low-pass filter.
+
+    :param audio: NumPy array of samples
+    :param cutoff: Cutoff frequency as a fraction of the sample rate (0 < cutoff < 0.5)
+    :return: Filtered NumPy array of the same length
+    """
+    return np.convolve(audio, lowpass_taps(cutoff), mode="same")
+
+
+class StreamResampler:
+    """
+    Resamples mono float samples that arrive in chunks (block averaging for integer
+    ratios, otherwise a low-pass below the new Nyquist frequency followed by linear
+    interpolation).
+
+    The filter history, an unfinished averaging block and the position of the next
+    output sample carry over between `feed` calls, so a signal fed chunk by chunk
+    comes out the same as the whole signal resampled at once.
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self._fed = 0
+        self._emitted = 0
+        # Input samples not filtered (or not averaged) yet
+        self._pending = np.zeros(0, dtype=np.float32)
+        # Filtered samples the next output samples are interpolated from, _start is the index of the first
+        self._filtered = np.zeros(0, dtype=np.float32)
+        self._start = 0
+        self._taps = None
+        if orig_sr != target_sr and orig_sr % target_sr and target_sr < orig_sr:
+            # Content above the new Nyquist frequency would fold back into the audible band
+            self._taps = lowpass_taps(0.45 * target_sr / orig_sr)
+            # The filter sees silence before the first sample
+            self._pending = np.zeros(len(self._taps) // 2, dtype=np.float32)
+
+    def feed(self, audio):
+        """
+        :param audio: NumPy array with the next samples at `orig_sr`
+        :return: NumPy array with the samples at `target_sr` that are complete so far
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if self.orig_sr == self.target_sr:
+            return audio
+        self._fed += len(audio)
+        pending = np.concatenate([self._pending, audio])
+        if self.orig_sr % self.target_sr == 0:
+            # Integer ratio (48k/32k -> 16k): average each block, which also acts as a low-pass
+            factor = self.orig_sr // self.target_sr
+            usable = len(pending) - len(pending) % factor
+            self._pending = pending[usable:]
+            return pending[:usable].reshape(-1, factor).mean(axis=1).astype(np.float32)
+        if self._taps is None:
+            self._pending = pending[:0]
+            return self._interpolate(pending, final=False)
+        if len(pending) < len(self._taps):
+            self._pending = pending
+            return np.zeros(0, dtype=np.float32)
+        filtered = np.convolve(pending, self._taps, mode="valid")
+        self._pending = pending[len(filtered):]
+        return self._interpolate(filtered, final=False)
+
+    def flush(self):
+        """
+        Ends the stream. A trailing partial averaging block is dropped.
+
+        :return: NumPy array with the remaining samples at `target_sr`
+        """
+        if self.orig_sr == self.target_sr or self.orig_sr % self.target_sr == 0:
+            return np.zeros(0, dtype=np.float32)
+        filtered = self._pending[:0]
+        if self._taps is not None:
+            half = len(self._taps) // 2
+            if len(self._pending) > half:
+                # The filter sees silence after the last sample
+                padded = np.concatenate([self._pending, np.zeros(half, dtype=np.float32)])
+                filtered = np.convolve(padded, self._taps, mode="valid")
+            self._pending = self._pending[:0]
+        return self._interpolate(filtered, final=True)
+
+    def _interpolate(self, filtered, final):
+        self._filtered = np.concatenate([self._filtered, filtered])
+        available = self._start + len(self._filtered)
+        total = int(round(self._fed * self.target_sr / self.orig_sr))
+        if not final:
+            # Output k sits at input position k * orig_sr / target_sr and needs the sample after it
+            total = min(total, (available - 1) * self.target_sr // self.orig_sr + 1) if available else 0
+        if total <= self._emitted or not len(self._filtered):
+            return np.zeros(0, dtype=np.float32)
+        positions = np.arange(self._emitted, total) * self.orig_sr / self.target_sr
+        out = np.interp(positions - self._start, np.arange(len(self._filtered)), self._filtered)
+        self._emitted = total
+        # Keep only what the next output samples are interpolated from
+        drop = min(self._emitted * self.orig_sr // self.target_sr - self._start, len(self._filtered))
+        self._filtered = self._filtered[drop:]
+        self._start += drop
+        return out.astype(np.float32)
+
+
+def resample(audio, orig_sr, target_sr):
+    """
+    Resamples mono float samples, see StreamResampler.
+
+    :param audio: NumPy array of samples
+    :param orig_sr: Sample rate of `audio`
+    :param target_sr: Desired sample rate
+    :return: Resampled NumPy array
+    """
+    if orig_sr == target_sr:
+        return audio
+    resampler = StreamResampler(orig_sr, target_sr)
+    return np.concatenate([resampler.feed(audio), resampler.flush()])
+
+
+def _decode_with_ffmpeg(data, sample_rate):
+    # Containers libsndfile cannot read (webm/opus from MediaRecorder, mp3, ...) are piped
+    # through ffmpeg over stdin/stdout so nothing touches the disk
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except FileNotFoundError as e:
+        raise AudioDecoderMissing("ffmpeg is not installed, only WAV, FLAC and OGG uploads can be decoded") from e
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')}") from e
+    return pcm16_to_float(out)
+
+
+def pcm16_to_float(data):
+    """
+    Converts little-endian 16-bit PCM bytes to float32 samples in [-1, 1].
+
+    :param data: PCM16 bytes
+    :return: float32 NumPy array
+    """
+    return np.frombuffer(data, "<i2").astype(np.float32) / 32768.0
+
+
+def decode_audio(data, sample_rate=WHISPER_SAMPLE_RATE):
+    """
+    Decodes an uploaded audio file into a mono float32 array, in memory.
+
+    :param data: Raw bytes of the uploaded file
+    :param sample_rate: Target sample rate (Whisper expects 16 kHz)
+    :return: float32 NumPy array in [-1, 1]
+    :raises RuntimeError: if the data cannot be decoded
+    :raises AudioDecoderMissing: if the format needs ffmpeg, which is not installed
+    """
+    try:
+        audio, orig_sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except RuntimeError:
+        # libsndfile raises a RuntimeError subclass for formats it does not understand
+        return _decode_with_ffmpeg(data, sample_rate)
+    audio = audio.mean(axis=1)
+    return resample(audio, orig_sr, sample_rate).astype(np.float32)
+
+
+def encode_audio(samples, sample_rate, audio_format="wav"):
+    """
+    Encodes float samples into one of AUDIO_FORMATS in memory.
+
+    :param samples: NumPy array of float samples
+    :param sample_rate: Sample rate of the samples
+    :param audio_format: Key of AUDIO_FORMATS
+    :return: Encoded file bytes
+    """
+    spec = AUDIO_FORMATS[audio_format]
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format=spec["format"], subtype=spec["subtype"])
+    return buffer.getvalue()
+
+
+def encode_wav(samples, sample_rate):
+    return encode_audio(samples, sample_rate, "wav")
+
+
+class StreamEncoder:
+    """
+    Incremental encoder for streamed responses.
+
+    `write` returns whatever encoded bytes became available, so they can be sent
+    right away. Opus-in-OGG is emitted page by page. WAV uses an open-ended header
+    followed by raw PCM. FLAC frames stream as they are encoded; libsndfile's final
+    rewrite of the STREAMINFO header is dropped, which decoders accept as
+    "length unknown".
+    """
+
+    def __init__(self, audio_format, sample_rate):
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self._sent = 0
+        self._buffer = None
+        self._file = None
+        if audio_format != "wav":
+            spec = AUDIO_FORMATS[audio_format]
+            self._buffer = io.BytesIO()
+            self._file = sf.SoundFile(self._buffer, mode="w", samplerate=sample_rate, channels=1,
+                                      format=spec["format"], subtype=spec["subtype"])
+
+    def _drain(self):
+        # Only hand out bytes past what was already sent, rewrites of earlier bytes cannot be streamed
+        view = self._buffer.getbuffer()
+        end = len(view)
+        chunk = bytes(view[self._sent:end])
+        view.release()
+        self._sent = max(self._sent, end)
+        return chunk
+
+    def write(self, samples):
+        if self._file is None:
+            header = wav_stream_header(self.sample_rate) if self._sent == 0 else b""
+            pcm = float_to_pcm16(samples)
+            self._sent += len(header) + len(pcm)
+            return header + pcm
+        self._file.write(np.asarray(samples, dtype=np.float32))
+        self._file.flush()
+        return self._drain()
+
+    def close(self):
+        if self._file is None:
+            return b""
+        self._file.close()
+        return self._drain()
@@ -0,0 +1,97 @@
+"""
+Compares the old temp-file audio path of server.py with the in-memory one.
+
+Only the audio plumbing is measured (no Whisper or Kokoro inference), since that
+is the part the two paths differ in.
+
+    python benchmarks/bench_audio_path.py --iterations 200
+    python benchmarks/bench_audio_path.py --input recording.webm
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+import whisper
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from audio_io import decode_audio, encode_wav  # noqa: E402
+
+
+TTS_SAMPLE_RATE = 24000
+
+
+def synthetic_upload(seconds, sample_rate=48000):
+    # Noisy tone as a stand-in for a browser recording
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.randn(len(t))
+    buffer = io.BytesIO()
+    sf.write(buffer, audio.astype(np.float32), sample_rate, format="WAV")
+    return buffer.getvalue()
+
+
+def old_transcribe_input(data):
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(data)
+        tmp.flush()
+        audio = whisper.load_audio(tmp.name)
+        os.unlink(tmp.name)
+    return audio
+
+
+def old_tts_output(samples):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_wav:
+        sf.write(tmp_wav.name, samples, TTS_SAMPLE_RATE)
+        audio_path = tmp_wav.name
+    with open(audio_path, "rb") as f:
+        audio_data = f.read()
+    os.unlink(audio_path)
+    return audio_data
+
+
+def measure(fn, arg, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, old, new):
+    old_ms, new_ms = statistics.median(old), statistics.median(new)
+    print(f"{name:<12} temp-file p50 {old_ms:8.2f} ms | in-memory p50 {new_ms:8.2f} ms"
+          f" | saved {old_ms - new_ms:8.2f} ms/request ({old_ms / new_ms:5.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="Audio file to use as the upload (default: synthetic 48 kHz WAV)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of the synthetic clips")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "rb") as f:
+            upload = f.read()
+    else:
+        upload = synthetic_upload(args.seconds)
+    samples = (0.1 * np.random.randn(int(args.seconds * TTS_SAMPLE_RATE))).astype(np.float32)
+
+    # Warm both paths once so imports and codec setup are not counted
+    old_transcribe_input(upload), decode_audio(upload)
+    old_tts_output(samples), encode_wav(samples, TTS_SAMPLE_RATE)
+
+    report("/transcribe", measure(old_transcribe_input, upload, args.iterations),
+           measure(decode_audio, upload, args.iterations))
+    report("/tts", measure(old_tts_output, samples, args.iterations),
+           measure(lambda s: encode_wav(s, TTS_SAMPLE_RATE), samples, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
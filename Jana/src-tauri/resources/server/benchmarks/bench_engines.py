@@ -0,0 +1,122 @@
+"""
+Side-by-side comparison of the transcription engines in engines.py.
+
+Each backend runs in its own subprocess so memory numbers are not mixed up. For
+every audio fixture the real-time factor (processing time / audio duration) is
+measured, along with the resident memory added by loading the model and the
+peak RSS of the process.
+
+    python benchmarks/bench_engines.py --backends openai ctranslate2 --model base
+    python benchmarks/bench_engines.py --fixtures my_clips/*.wav --repeat 5
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, SERVER_DIR)
+
+# Voice clips bundled with the Tauri front end
+DEFAULT_FIXTURES = sorted(glob.glob(os.path.join(SERVER_DIR, "..", "..", "..", "src", "assets", "voices", "*.mp3")))
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_backend(backend, model_name, fixtures, repeat, threads):
+    from audio_io import WHISPER_SAMPLE_RATE, decode_audio
+    from engines import create_engine
+
+    clips = []
+    for path in fixtures:
+        with open(path, "rb") as f:
+            clips.append((os.path.basename(path), decode_audio(f.read())))
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    engine = create_engine(backend, model_name, threads)
+    load_seconds = time.perf_counter() - started
+    rss_model = current_rss_mb() - rss_before
+    engine.transcribe(clips[0][1])  # warm-up
+
+    per_fixture = []
+    for name, clip in clips:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = engine.transcribe(clip)
+            timings.append(time.perf_counter() - started)
+        duration = len(clip) / WHISPER_SAMPLE_RATE
+        per_fixture.append({
+            "fixture": name,
+            "audio_seconds": duration,
+            "median_seconds": statistics.median(timings),
+            "rtf": statistics.median(timings) / duration,
+            "text": result["text"].strip(),
+        })
+
+    return {
+        "backend": backend,
+        "model": model_name,
+        "load_seconds": load_seconds,
+        "model_rss_mb": rss_model,
+        "peak_rss_mb": peak_rss_mb(),
+        "mean_rtf": statistics.mean(f["rtf"] for f in per_fixture),
+        "fixtures": per_fixture,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["openai", "ctranslate2"])
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--fixtures", nargs="+", default=DEFAULT_FIXTURES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.model, args.fixtures, args.repeat, args.threads)))
+        return
+
+    results = []
+    for backend in args.backends:
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--model", args.model, "--repeat", str(args.repeat),
+             "--threads", str(args.threads), "--fixtures", *args.fixtures],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'backend':<12} {'model':<8} {'load s':>7} {'model MB':>9} {'peak MB':>8} {'mean RTF':>9}")
+    for r in results:
+        print(f"{r['backend']:<12} {r['model']:<8} {r['load_seconds']:>7.2f} {r['model_rss_mb']:>9.1f}"
+              f" {r['peak_rss_mb']:>8.1f} {r['mean_rtf']:>9.3f}")
+    print()
+    for r in results:
+        for f in r["fixtures"]:
+            print(f"{r['backend']:<12} {f['fixture']:<28} {f['audio_seconds']:>6.1f}s  RTF {f['rtf']:.3f}  {f['text'][:60]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measures how serve.py throughput scales with the number of worker processes.
+
+For each worker count the server is started, requests are fired at /tts or
+/transcribe from a fixed number of client threads per worker, and the completed
+requests per second are reported. The TTS cache is disabled so every request
+does real inference.
+
+    python benchmarks/bench_scaling.py --workers 1 2 4 --endpoint tts --duration 30
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import spawn_server, wait_ready
+
+
+TEXT = "Interface one slash one slash one is up. The DNS server responded in twelve milliseconds."
+
+
+def make_request(base_url, endpoint, audio):
+    if endpoint == "tts":
+        response = requests.post(f"{base_url}/tts", json={"text": TEXT}, timeout=120)
+    else:
+        response = requests.post(f"{base_url}/transcribe", files={"audio": ("clip.wav", audio)}, timeout=120)
+    # Busy (429) and not ready (503) are load outcomes to count, anything else is a broken run
+    if response.status_code not in (429, 503):
+        response.raise_for_status()
+    return response.status_code
+
+
+def run_load(base_url, endpoint, audio, concurrency, duration):
+    deadline = time.time() + duration
+    completed = [0] * concurrency
+    rejected = [0] * concurrency
+
+    def client(index):
+        while time.time() < deadline:
+            if make_request(base_url, endpoint, audio) == 200:
+                completed[index] += 1
+            else:
+                rejected[index] += 1
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return sum(completed) / (time.time() - start), sum(rejected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--intra-op-threads", type=int, default=1)
+    parser.add_argument("--endpoint", choices=["tts", "transcribe"], default="tts")
+    parser.add_argument("--clients-per-worker", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+    for workers in args.workers:
+        proc = spawn_server(args.port, SPEECH_WORKERS=workers, SPEECH_INTRA_OP_THREADS=args.intra_op_threads)
+        try:
+            wait_ready(base_url)
+            audio = None
+            if args.endpoint == "transcribe":
+                # Use the server's own speech as the transcription fixture
+                audio = requests.post(f"{base_url}/tts", json={"text": TEXT}, timeout=120).content
+            make_request(base_url, args.endpoint, audio)
+            throughput, rejected = run_load(base_url, args.endpoint, audio, workers * args.clients_per_worker,
+                                            args.duration)
+            results.append((workers, throughput, rejected))
+            print(f"{workers} workers: {throughput:.2f} req/s, {rejected} rejected", flush=True)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    base = results[0][1] if results else 0
+    print(f"\n{'workers':>8} {'req/s':>8} {'speedup':>8} {'429/503':>8}  (cores: {os.cpu_count()})")
+    for workers, throughput, rejected in results:
+        print(f"{workers:>8} {throughput:>8.2f} {throughput / base if base else 0:>7.2f}x {rejected:>8}")
+
+
+if __name__ == "__main__":
+    main()
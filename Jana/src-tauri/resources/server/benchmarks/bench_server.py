@@ -0,0 +1,238 @@
+"""
+Reproducible load benchmark for the speech server.
+
+Drives /tts with the texts in fixtures/tts_texts.json and /transcribe with the
+bundled voice clips, at one or more client concurrency levels. For every
+endpoint and level it reports p50/p95/p99 latency, real-time factor (latency /
+audio duration), throughput and peak server memory, and writes everything to a JSON
+file so runs with different models, thread counts or batching settings can be
+compared.
+
+Memory is the peak PSS of the spawned (or --server-pid) process tree, which counts
+pages the workers share with the parent once; without access to the process it is
+the peak RSS of whichever worker answered /metrics.
+
+Fixtures are sent in a fixed round-robin order, so two runs issue the same
+requests. Against an already running server, start it with TTS_CACHE_MEMORY_MB=0
+and TTS_CACHE_DIR= so /tts is not served from the cache, or pass --spawn.
+
+    python benchmarks/bench_server.py --spawn --concurrency 1 4 8 --requests 40
+    python benchmarks/bench_server.py --url http://speech-box:5000 --endpoints tts
+    python benchmarks/bench_server.py --compare results/before.json results/after.json
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+import soundfile as sf
+
+from common import FIXTURES_DIR, SERVER_DIR, process_tree_pss_mb, spawn_server, wait_ready
+
+
+DEFAULT_AUDIO_FIXTURES = sorted(glob.glob(os.path.join(SERVER_DIR, "..", "..", "..", "src", "assets", "voices", "*.mp3")))
+DEFAULT_TEXT_FIXTURES = os.path.join(FIXTURES_DIR, "tts_texts.json")
+
+
+def audio_seconds(data):
+    with sf.SoundFile(io.BytesIO(data)) as f:
+        return f.frames / f.samplerate
+
+
+def load_fixtures(args):
+    with open(args.texts) as f:
+        texts = json.load(f)
+    clips = []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            data = f.read()
+        clips.append({"name": os.path.basename(path), "data": data, "seconds": audio_seconds(data)})
+    return texts, clips
+
+
+def tts_request(base_url, fixture):
+    started = time.perf_counter()
+    response = requests.post(f"{base_url}/tts", json={"text": fixture["text"]}, timeout=300)
+    latency = time.perf_counter() - started
+    if response.status_code != 200:
+        return {"fixture": fixture["name"], "status": response.status_code, "latency": latency}
+    return {"fixture": fixture["name"], "status": 200, "latency": latency,
+            "audio_seconds": audio_seconds(response.content)}
+
+
+def transcribe_request(base_url, fixture):
+    started = time.perf_counter()
+    response = requests.post(f"{base_url}/transcribe", files={"audio": (fixture["name"], fixture["data"])},
+                             timeout=300)
+    latency = time.perf_counter() - started
+    return {"fixture": fixture["name"], "status": response.status_code, "latency": latency,
+            "audio_seconds": fixture["seconds"]}
+
+
+class PssSampler:
+    """Samples the proportional set size of the server process tree in the background."""
+
+    def __init__(self, pid, interval=0.25):
+        self._pid = pid
+        self._interval = interval
+        self._stop = threading.Event()
+        self.peak_mb = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, process_tree_pss_mb(self._pid))
+            self._stop.wait(self._interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_level(base_url, endpoint, fixtures, concurrency, num_requests):
+    request_fn = tts_request if endpoint == "tts" else transcribe_request
+    # Fixed round-robin order keeps runs comparable
+    plan = [fixtures[i % len(fixtures)] for i in range(num_requests)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(lambda fixture: request_fn(base_url, fixture), plan))
+    wall = time.perf_counter() - started
+
+    ok = [s for s in samples if s["status"] == 200]
+    latencies = [s["latency"] for s in ok]
+    rtfs = [s["latency"] / s["audio_seconds"] for s in ok if s.get("audio_seconds")]
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "succeeded": len(ok),
+        "rejected": sum(1 for s in samples if s["status"] in (429, 503)),
+        "failed": sum(1 for s in samples if s["status"] not in (200, 429, 503)),
+        "latency_ms": {"p50": float(1000 * p50), "p95": float(1000 * p95), "p99": float(1000 * p99)},
+        "rtf": {"mean": float(np.mean(rtfs)) if rtfs else 0.0, "p95": float(np.percentile(rtfs, 95)) if rtfs else 0.0},
+        "throughput_rps": len(ok) / wall,
+        "audio_seconds_per_second": sum(s.get("audio_seconds", 0.0) for s in ok) / wall,
+        "wall_seconds": wall,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'endpoint':<11} {'conc':>4} {'ok':>4} {'rej':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          f" {'RTF':>6} {'req/s':>6} {'peak MB':>8}")
+    for r in results:
+        peak = r.get("peak_pss_mb", r.get("peak_rss_mb"))
+        print(f"{r['endpoint']:<11} {r['concurrency']:>4} {r['succeeded']:>4} {r['rejected']:>4}"
+              f" {r['latency_ms']['p50']:>8.0f} {r['latency_ms']['p95']:>8.0f} {r['latency_ms']['p99']:>8.0f}"
+              f" {r['rtf']['mean']:>6.3f} {r['throughput_rps']:>6.2f} {peak if peak is not None else 0:>8.0f}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+    with open(after_path) as f:
+        after = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"{'endpoint':<11} {'conc':>4} {'p50 ms':>16} {'p99 ms':>16} {'req/s':>14}")
+    for key in sorted(before.keys() & after.keys()):
+        b, a = before[key], after[key]
+        print(f"{key[0]:<11} {key[1]:>4}"
+              f" {b['latency_ms']['p50']:>7.0f} -> {a['latency_ms']['p50']:<6.0f}"
+              f" {b['latency_ms']['p99']:>7.0f} -> {a['latency_ms']['p99']:<6.0f}"
+              f" {b['throughput_rps']:>5.2f} -> {a['throughput_rps']:<5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--spawn", action="store_true", help="Start serve.py (cache disabled) on --port")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--server-pid", type=int, help="Sample PSS of this process tree instead of /metrics")
+    parser.add_argument("--endpoints", nargs="+", choices=["tts", "transcribe"], default=["tts", "transcribe"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--requests", type=int, default=20, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--texts", default=DEFAULT_TEXT_FIXTURES)
+    parser.add_argument("--audio", nargs="+", default=DEFAULT_AUDIO_FIXTURES)
+    parser.add_argument("--output", default=os.path.join("results", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    proc = None
+    base_url = args.url
+    if args.spawn:
+        proc = spawn_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+    server_pid = args.server_pid or (proc.pid if proc else None)
+
+    try:
+        wait_ready(base_url)
+        texts, clips = load_fixtures(args)
+        fixtures = {"tts": texts, "transcribe": clips}
+        for endpoint in args.endpoints:
+            run_level(base_url, endpoint, fixtures[endpoint], 1, args.warmup)
+
+        results = []
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                if server_pid:
+                    with PssSampler(server_pid) as sampler:
+                        result = run_level(base_url, endpoint, fixtures[endpoint], concurrency, args.requests)
+                    result["peak_pss_mb"] = sampler.peak_mb
+                else:
+                    result = run_level(base_url, endpoint, fixtures[endpoint], concurrency, args.requests)
+                    # Peak of the worker that answered, the closest we get without access to the process
+                    result["peak_rss_mb"] = requests.get(f"{base_url}/metrics", timeout=10).json()["process"]["peak_rss_mb"]
+                results.append(result)
+                print_results([result])
+
+        server_metrics = requests.get(f"{base_url}/metrics", timeout=10).json()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    print()
+    print_results(results)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "host": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "server_env": {key: value for key, value in os.environ.items()
+                       if key.startswith(("WHISPER_", "KOKORO_", "SPEECH_", "TTS_", "ADMISSION_"))},
+        "args": {key: value for key, value in vars(args).items() if key != "compare"},
+        "results": results,
+        "server_metrics": server_metrics,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
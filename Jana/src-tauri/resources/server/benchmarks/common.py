@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def wait_ready(base_url, timeout=600):
+    """
+    Waits until every worker has its models loaded. /readyz only answers for the
+    worker that took the request, so the worker counts in /metrics are checked.
+
+    :raises RuntimeError: if a worker failed to load its models, or on timeout
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            workers = requests.get(f"{base_url}/metrics", timeout=2).json()["workers"]
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            workers = None
+        if workers and workers["failed"]:
+            error = requests.get(f"{base_url}/readyz", timeout=2).json().get("error")
+            raise RuntimeError(f"{workers['failed']} of {workers['total']} workers failed to load models: {error}")
+        if workers and workers["ready"] >= workers["total"]:
+            return
+        time.sleep(1)
+    raise RuntimeError("Server did not become ready")
+
+
+def spawn_server(port, **env_overrides):
+    """
+    Starts serve.py with the TTS cache disabled, so every request does real inference.
+
+    :param port: Port to bind
+    :param env_overrides: Extra environment variables (e.g. SPEECH_WORKERS="2")
+    :return: subprocess.Popen of the server
+    """
+    env = dict(os.environ, PORT=str(port), TTS_CACHE_MEMORY_MB="0", TTS_CACHE_DIR="")
+    env.update({key: str(value) for key, value in env_overrides.items()})
+    return subprocess.Popen([sys.executable, "serve.py"], cwd=SERVER_DIR, env=env)
+
+
+def _process_tree(pid):
+    # The process and all its descendants (the gunicorn workers)
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        yield current
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+
+
+def pss_bytes(pid):
+    """
+    Proportional set size of a process: each shared page counts for 1/n of its size
+    in each of the n processes mapping it. Unlike RSS it adds up across processes, so
+    weights shared copy-on-write by forked workers are not counted once per worker.
+
+    :return: PSS in bytes, the RSS if smaps_rollup is not available (Linux < 4.14), None if the process is gone
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def process_tree_pss_mb(pid):
+    # Memory the whole server tree actually uses, see pss_bytes
+    return sum(pss_bytes(current) or 0 for current in _process_tree(pid)) / (1024 * 1024)
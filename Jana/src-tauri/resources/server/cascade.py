@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class TranscriptionCascade:
+    """
+    Routes short clips to a small model first and falls back to the large one.
+
+    Clips up to `max_seconds` long go to `small`. If its average log-probability is
+    below `min_avg_logprob` the clip is transcribed again with `large`. Longer clips
+    go straight to `large`. Both tiers are BatchingTranscriber-like objects with a
+    `transcribe(audio)` method; `small` may be None to disable the cascade.
+    """
+
+    def __init__(self, small, large, max_seconds=4.0, min_avg_logprob=-0.7, sample_rate=16000, window=1000):
+        self._small = small
+        self._large = large
+        self._max_seconds = max_seconds
+        self._min_avg_logprob = min_avg_logprob
+        self._sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._latencies = {"small": deque(maxlen=window), "large": deque(maxlen=window)}
+        self._requests = {"small": 0, "large": 0}
+        self._fallbacks = 0
+        self._end_to_end = deque(maxlen=window)
+
+    def _run(self, tier, audio, record_stats):
+        started = time.perf_counter()
+        result = (self._small if tier == "small" else self._large).transcribe(audio)
+        if record_stats:
+            with self._lock:
+                self._requests[tier] += 1
+                self._latencies[tier].append(time.perf_counter() - started)
+        return result
+
+    def transcribe(self, audio, record_stats=True):
+        """
+        :param audio: 16 kHz float32 clip
+        :param record_stats: False leaves the call out of `stats`, e.g. for streaming partials
+        :return: Result dict from the tier that produced the final text, plus "tier"
+        """
+        started = time.perf_counter()
+        duration = len(audio) / self._sample_rate
+        tier = "large"
+        if self._small is not None and duration <= self._max_seconds:
+            result = self._run("small", audio, record_stats)
+            if result["avg_logprob"] >= self._min_avg_logprob:
+                tier = "small"
+            elif record_stats:
+                with self._lock:
+                    self._fallbacks += 1
+        if tier == "large":
+            result = self._run("large", audio, record_stats)
+        if record_stats:
+            with self._lock:
+                self._end_to_end.append(time.perf_counter() - started)
+        return dict(result, tier=tier)
+
+    def stats(self):
+        def percentiles(values):
+            if not values:
+                return {"p50_ms": 0.0, "p95_ms": 0.0}
+            p50, p95 = np.percentile(list(values), [50, 95])
+            return {"p50_ms": float(1000 * p50), "p95_ms": float(1000 * p95)}
+
+        with self._lock:
+            small_requests = self._requests["small"]
+            return {
+                "enabled": self._small is not None,
+                "max_seconds": self._max_seconds,
+                "min_avg_logprob": self._min_avg_logprob,
+                "tiers": {
+                    tier: dict(percentiles(self._latencies[tier]), requests=self._requests[tier])
+                    for tier in ("small", "large")
+                },
+                "fallbacks": self._fallbacks,
+                "fallback_rate": self._fallbacks / small_requests if small_requests else 0.0,
+                "end_to_end": percentiles(self._end_to_end),
+            }
@@ -0,0 +1,163 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# Same thresholds as whisper.transcribe: a greedy result this repetitive or this unlikely is
+# decoded again at higher temperatures, unless the clip is most likely silence
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+class TranscriptionEngine(ABC):
+    """
+    Interface for speech-to-text backends used by BatchingTranscriber.
+
+    `transcribe_batch` takes a list of 16 kHz float32 clips and returns one dict per
+    clip with "text", "avg_logprob" and "no_speech_prob". `fork_safe` tells serve.py
+    whether the engine can be loaded in the parent and shared with forked workers.
+    """
+
+    name = ""
+    fork_safe = False
+
+    @abstractmethod
+    def transcribe_batch(self, clips):
+        ...
+
+    def set_threads(self, threads):
+        # For engines loaded before a fork, whose thread count is set per worker afterwards
+        pass
+
+    def transcribe(self, clip):
+        return self.transcribe_batch([clip])[0]
+
+
+class WhisperEngine(TranscriptionEngine):
+    """
+    Reference openai-whisper (PyTorch) backend.
+
+    Clips that fit in one 30 second window are decoded together as a padded batch of
+    log-mel spectrograms, greedily at temperature 0. Clips whose result fails the
+    same checks `model.transcribe` applies (compression ratio, average log
+    probability) are decoded again through `model.transcribe`, which retries at higher
+    temperatures; so are clips longer than a window, which it seeks across.
+    """
+
+    name = "openai"
+    # Loading only touches the weights, which forked workers share copy-on-write
+    fork_safe = True
+
+    def __init__(self, model_name, threads=0):
+        # Imported here so PyTorch and openai-whisper are only needed when this backend is selected
+        import whisper
+
+        self.set_threads(threads)
+        self._model = whisper.load_model(model_name)
+
+    def set_threads(self, threads):
+        import torch
+
+        if threads > 0:
+            # torch's intra-op pool is per process, this sets it for everything else using torch too
+            torch.set_num_threads(threads)
+
+    def _transcribe(self, clip):
+        transcription = self._model.transcribe(clip, fp16=False)
+        segments = transcription["segments"]
+        return {
+            "text": transcription["text"],
+            "avg_logprob": float(np.mean([s["avg_logprob"] for s in segments])) if segments else 0.0,
+            "no_speech_prob": float(np.mean([s["no_speech_prob"] for s in segments])) if segments else 1.0,
+        }
+
+    def transcribe_batch(self, clips):
+        import torch
+        import whisper
+
+        results = [None] * len(clips)
+        short = [i for i, clip in enumerate(clips) if len(clip) <= whisper.audio.N_SAMPLES]
+
+        for i, clip in enumerate(clips):
+            if i not in short:
+                results[i] = self._transcribe(clip)
+
+        if short:
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(clips[i]), n_mels=self._model.dims.n_mels)
+                for i in short
+            ]).to(self._model.device)
+            options = whisper.DecodingOptions(fp16=False, without_timestamps=True)
+            with torch.no_grad():
+                decoded = whisper.decode(self._model, mels, options)
+            for i, result in zip(short, decoded):
+                silence = result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+                if not silence and (
+                    result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+                ):
+                    results[i] = self._transcribe(clips[i])
+                    continue
+                results[i] = {
+                    "text": result.text,
+                    "avg_logprob": result.avg_logprob,
+                    "no_speech_prob": result.no_speech_prob,
+                }
+        return results
+
+
+class CTranslate2Engine(TranscriptionEngine):
+    """
+    int8-quantized CTranslate2 backend (faster-whisper).
+
+    CTranslate2 batches inside its own runtime, so clips are transcribed one after the
+    other here. The model owns a native thread pool, so it has to be created in the
+    process that uses it.
+    """
+
+    name = "ctranslate2"
+    fork_safe = False
+
+    def __init__(self, model_name, threads=0, compute_type="int8"):
+        # Imported here so the dependency is only needed when this backend is selected
+        from faster_whisper import WhisperModel
+
+        self._model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=threads)
+
+    def transcribe_batch(self, clips):
+        results = []
+        for clip in clips:
+            segments, _ = self._model.transcribe(clip, beam_size=1, without_timestamps=True)
+            segments = list(segments)
+            results.append({
+                "text": "".join(segment.text for segment in segments),
+                "avg_logprob": float(np.mean([s.avg_logprob for s in segments])) if segments else 0.0,
+                "no_speech_prob": float(np.mean([s.no_speech_prob for s in segments])) if segments else 1.0,
+            })
+        return results
+
+
+ENGINES = {
+    WhisperEngine.name: WhisperEngine,
+    CTranslate2Engine.name: CTranslate2Engine,
+}
+
+
+def engine_class(backend):
+    """
+    :param backend: Key of ENGINES ("openai" or "ctranslate2")
+    :return: TranscriptionEngine subclass
+    :raises ValueError: for an unknown backend
+    """
+    if backend not in ENGINES:
+        raise ValueError(f"Unknown Whisper backend: {backend}. Available backends: {list(ENGINES)}")
+    return ENGINES[backend]
+
+
+def create_engine(backend, model_name, threads=0):
+    """
+    :param backend: Key of ENGINES ("openai" or "ctranslate2")
+    :param model_name: Whisper model size, e.g. "tiny" or "base"
+    :param threads: Inference threads, 0 keeps the backend's default
+    :return: TranscriptionEngine
+    """
+    return engine_class(backend)(model_name, threads=threads)
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class BatchingTranscriber:
+    """
+    Background worker that groups concurrent transcription requests into batches.
+
+    Requests are collected for up to `window_ms` after the first one arrives (or until
+    `max_batch_size` is reached) and handed to the engine together (see engines.py).
+    The engine is only ever used from the worker thread.
+    """
+
+    def __init__(self, engine, window_ms=10, max_batch_size=8):
+        self._engine = engine
+        self._window = window_ms / 1000.0
+        self._max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="whisper-batcher", daemon=True)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes = Counter()
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._total_inference = 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, audio):
+        """
+        Queues a 16 kHz float32 clip for transcription.
+
+        :param audio: Audio samples as returned by audio_io.decode_audio
+        :return: Future resolving to {"text", "avg_logprob", "no_speech_prob"}
+        """
+        future = Future()
+        self._queue.put((audio, future, time.perf_counter()))
+        with self._lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return future
+
+    def transcribe(self, audio, timeout=None):
+        return self.submit(audio).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "batches": self._batches,
+                "mean_batch_size": self._requests / self._batches if self._batches else 0.0,
+                "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "mean_queue_wait_ms": 1000 * self._total_wait / self._requests if self._requests else 0.0,
+                "mean_batch_inference_ms": 1000 * self._total_inference / self._batches if self._batches else 0.0,
+                "engine": self._engine.name,
+                "window_ms": self._window * 1000,
+                "max_batch_size": self._max_batch_size,
+            }
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self._window
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self._engine.transcribe_batch([audio for audio, _, _ in batch])
+            except Exception as e:
+                print("Error in batched transcription:", str(e))
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            with self._lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._total_wait += sum(started - queued for _, _, queued in batch)
+                self._total_inference += finished - started
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
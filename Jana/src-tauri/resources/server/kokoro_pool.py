@@ -0,0 +1,131 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import onnxruntime as ort
+from kokoro_onnx import Kokoro
+
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def session_options(intra_op_threads=0, inter_op_threads=0, graph_optimization="all", execution_mode="sequential"):
+    """
+    Builds onnxruntime session options from plain config values.
+
+    :param intra_op_threads: Threads used inside one operator, 0 lets onnxruntime decide
+    :param inter_op_threads: Threads used across operators in parallel execution mode
+    :param graph_optimization: One of GRAPH_OPTIMIZATION_LEVELS
+    :param execution_mode: One of EXECUTION_MODES
+    :return: ort.SessionOptions
+    """
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    options.execution_mode = EXECUTION_MODES[execution_mode]
+    return options
+
+
+class KokoroPool:
+    """
+    Fixed set of Kokoro instances, each with its own ONNX Runtime session.
+
+    Requests take a free session with `acquire()` (waiting if all are busy) so
+    concurrent synthesis runs on separate sessions instead of contending on one.
+    When `intra_op_threads` is 0 and there is more than one session, the cores are
+    split evenly between sessions to avoid oversubscription.
+    """
+
+    def __init__(self, model_path, voices_path, voices=None, size=1, intra_op_threads=0,
+                 inter_op_threads=0, graph_optimization="all", execution_mode="sequential"):
+        if not intra_op_threads and size > 1:
+            intra_op_threads = max(1, (os.cpu_count() or 1) // size)
+        self.config = {
+            "size": size,
+            "intra_op_threads": intra_op_threads,
+            "inter_op_threads": inter_op_threads,
+            "graph_optimization": graph_optimization,
+            "execution_mode": execution_mode,
+        }
+        options = session_options(intra_op_threads, inter_op_threads, graph_optimization, execution_mode)
+
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = time.perf_counter()
+        self._instances = []
+        self._session_stats = []
+        for index in range(size):
+            session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            instance = Kokoro.from_session(session, voices_path)
+            if voices is not None:
+                instance.voices = voices
+            self._instances.append(instance)
+            self._session_stats.append({"requests": 0, "busy_seconds": 0.0})
+            self._free.put(index)
+        self._total_wait = 0.0
+        self._acquisitions = 0
+
+    def __len__(self):
+        return len(self._instances)
+
+    @contextmanager
+    def acquire(self, index=None):
+        """
+        Borrows a free Kokoro instance for the duration of the with-block.
+
+        :param index: Specific session to wait for (used for warm-up), any free one if None
+        """
+        waited = time.perf_counter()
+        if index is None:
+            index = self._free.get()
+        else:
+            # Wait for the requested session, handing back any other one we get
+            skipped = []
+            while True:
+                candidate = self._free.get()
+                if candidate == index:
+                    break
+                skipped.append(candidate)
+            for candidate in skipped:
+                self._free.put(candidate)
+        started = time.perf_counter()
+        try:
+            yield self._instances[index]
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._acquisitions += 1
+                self._total_wait += started - waited
+                self._session_stats[index]["requests"] += 1
+                self._session_stats[index]["busy_seconds"] += finished - started
+            self._free.put(index)
+
+    def create(self, text, voice, speed=1.0):
+        with self.acquire() as kokoro:
+            return kokoro.create(text, voice=voice, speed=speed)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._created
+        with self._lock:
+            sessions = [
+                dict(stats, utilization=stats["busy_seconds"] / elapsed if elapsed else 0.0)
+                for stats in self._session_stats
+            ]
+            return {
+                "config": self.config,
+                "free_sessions": self._free.qsize(),
+                "mean_wait_ms": 1000 * self._total_wait / self._acquisitions if self._acquisitions else 0.0,
+                "sessions": sessions,
+            }
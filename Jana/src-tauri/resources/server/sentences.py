@@ -0,0 +1,78 @@
+import re
+
+
+# Sentence ends on terminal punctuation followed by whitespace, or on a line break
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n+")
+CLAUSE_BOUNDARY = re.compile(r"(?<=[,)])\s+")
+MAX_SENTENCE_CHARS = 300
+
+
+def _split_long(sentence, max_chars):
+    # Break an overlong sentence at clause boundaries, then at whitespace
+    pieces = []
+    current = ""
+    for part in CLAUSE_BOUNDARY.split(sentence):
+        while len(part) > max_chars:
+            cut = part.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(part[:cut].strip())
+            part = part[cut:].strip()
+        if current and len(current) + len(part) + 1 > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sentences(text, max_chars=MAX_SENTENCE_CHARS):
+    """
+    Splits text into sentence-sized chunks suitable for incremental synthesis.
+
+    :param text: Text to split
+    :param max_chars: Longest chunk to return, longer sentences are split at clauses
+    :return: List of non-empty chunks in original order
+    """
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > max_chars:
+            sentences.extend(_split_long(sentence, max_chars))
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+class SentenceBuffer:
+    """
+    Collects streamed text and hands out sentences as soon as they are complete, so
+    synthesis can start before the whole reply has arrived.
+    """
+
+    def __init__(self, max_chars=MAX_SENTENCE_CHARS):
+        self._max_chars = max_chars
+        self._pending = ""
+
+    def feed(self, text):
+        """
+        :param text: Next piece of the stream
+        :return: Sentences completed by this piece, possibly none
+        """
+        self._pending += text
+        boundaries = list(SENTENCE_BOUNDARY.finditer(self._pending))
+        if not boundaries:
+            return []
+        end = boundaries[-1].end()
+        complete, self._pending = self._pending[:end], self._pending[end:]
+        return split_sentences(complete, self._max_chars)
+
+    def flush(self):
+        """
+        :return: Whatever is left once the stream has ended
+        """
+        rest, self._pending = self._pending, ""
+        return split_sentences(rest, self._max_chars)
@@ -0,0 +1,85 @@
+"""
+Production entry point for the speech server.
+
+The Whisper weights are loaded once in the parent process, then gunicorn forks
+SPEECH_WORKERS workers that share those pages copy-on-write. Each worker sets its
+own intra-op thread count and creates the parts that cannot cross a fork (the
+batching thread and the ONNX Runtime sessions for Kokoro).
+
+The parent binds the port first and loads the weights right after (when_ready), so
+connections are accepted from the start but only answered once the workers are
+forked, a few seconds later for the Whisper weights. The workers then answer
+/healthz at once and load their own part in the background, /readyz reports 503
+until that is done, or the error if it failed. /readyz only speaks for the worker
+that answered, the "workers" entry of /metrics counts how many are ready. If the
+parent could not load the weights, every worker tries again on its own.
+
+    SPEECH_WORKERS=4 SPEECH_INTRA_OP_THREADS=2 python serve.py
+"""
+import gc
+import os
+
+from gunicorn.app.base import BaseApplication
+
+import server
+
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 5000))
+
+# Threads each worker gives to Whisper (torch) and Kokoro (onnxruntime) inference
+SPEECH_INTRA_OP_THREADS = int(os.getenv("SPEECH_INTRA_OP_THREADS", 2))
+# Defaults to one worker per SPEECH_INTRA_OP_THREADS cores so workers do not oversubscribe
+SPEECH_WORKERS = int(os.getenv("SPEECH_WORKERS", 0)) or max(1, (os.cpu_count() or 1) // SPEECH_INTRA_OP_THREADS)
+# Request threads per worker, these mostly wait on the batching queue or stream responses
+SPEECH_WORKER_THREADS = int(os.getenv("SPEECH_WORKER_THREADS", 8))
+
+
+def when_ready(arbiter):
+    # Runs after bind and before the workers are forked
+    try:
+        server.load_shared_models()
+    except Exception as e:
+        print("Could not load the shared models before forking, each worker loads its own:", str(e))
+    # Move everything allocated so far out of the GC's reach, so collections in the
+    # workers do not write to (and un-share) the parent's object pages
+    gc.freeze()
+
+
+def post_fork(arbiter, worker):
+    # Loading in the background keeps a failure from killing the worker, which gunicorn
+    # would only boot again in a loop; the worker stays up and /readyz reports the error
+    server.start_model_loading(intra_op_threads=SPEECH_INTRA_OP_THREADS)
+
+
+def worker_exit(arbiter, worker):
+    server.stop_worker()
+
+
+class SpeechApplication(BaseApplication):
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+if __name__ == "__main__":
+    print(f"Starting speech server with {SPEECH_WORKERS} workers x {SPEECH_INTRA_OP_THREADS} intra-op threads")
+    server.worker_count = SPEECH_WORKERS
+    SpeechApplication(server.app, {
+        "bind": f"{HOST}:{PORT}",
+        "workers": SPEECH_WORKERS,
+        "worker_class": "gthread",
+        "threads": SPEECH_WORKER_THREADS,
+        "timeout": 120,
+        "when_ready": when_ready,
+        "post_fork": post_fork,
+        "worker_exit": worker_exit,
+    }).run()
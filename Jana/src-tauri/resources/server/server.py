@@ -1,23 +1,128 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import whisper
-import tempfile
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+import base64
+import json
+import functools
+import multiprocessing
 import os
+import resource
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+import numpy as np
 import requests
-from kokoro_onnx import Kokoro
-import soundfile as sf
+
+from admission import AdmissionController, AdmissionRejected, AdmissionSlot
+from audio_io import (
+    AUDIO_FORMATS, WHISPER_SAMPLE_RATE, AudioDecoderMissing, StreamEncoder, StreamResampler, decode_audio, encode_audio,
+    pcm16_to_float, trim_silence
+)
+from cascade import TranscriptionCascade
+from engines import create_engine, engine_class
+from inference_queue import BatchingTranscriber
+from kokoro_pool import KokoroPool
+from sentences import SentenceBuffer, split_sentences
+from tts_cache import TTSCache
+from vad import SpeechSegmenter
+from voices import VoiceTable
 
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
+
+# Micro-batching of concurrent transcriptions: how long to wait for more clips and how many to decode together
+WHISPER_BATCH_WINDOW_MS = float(os.getenv("WHISPER_BATCH_WINDOW_MS", 10))
+WHISPER_MAX_BATCH_SIZE = int(os.getenv("WHISPER_MAX_BATCH_SIZE", 8))
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+# Transcription engine: "openai" (reference PyTorch whisper) or "ctranslate2" (int8 faster-whisper)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai")
+# Cascade, off unless WHISPER_CASCADE=1 since it loads a second model: clips up to
+# WHISPER_CASCADE_MAX_SECONDS go to WHISPER_CASCADE_MODEL first and fall back to WHISPER_MODEL
+# when its average log-probability is below WHISPER_CASCADE_MIN_LOGPROB
+WHISPER_CASCADE = os.getenv("WHISPER_CASCADE", "0") == "1"
+WHISPER_CASCADE_MODEL = os.getenv("WHISPER_CASCADE_MODEL", "tiny")
+WHISPER_CASCADE_MAX_SECONDS = float(os.getenv("WHISPER_CASCADE_MAX_SECONDS", 4.0))
+WHISPER_CASCADE_MIN_LOGPROB = float(os.getenv("WHISPER_CASCADE_MIN_LOGPROB", -0.7))
+
+# Synthesized audio cache: in-memory LRU budget, and an on-disk tier (empty TTS_CACHE_DIR disables it)
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", 64))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", 512))
+
+KOKORO_MODEL_PATH = "kokoro-v1.0.onnx"
+KOKORO_VOICES_PATH = "voices.bin"
+
+# Kokoro ONNX Runtime sessions per process and their tuning (0 threads = onnxruntime default,
+# 0 sessions = derived from the worker's share of the cores, see kokoro_session_count)
+KOKORO_SESSIONS = int(os.getenv("KOKORO_SESSIONS", 0))
+KOKORO_INTRA_OP_THREADS = int(os.getenv("KOKORO_INTRA_OP_THREADS", 0))
+KOKORO_INTER_OP_THREADS = int(os.getenv("KOKORO_INTER_OP_THREADS", 0))
+KOKORO_GRAPH_OPTIMIZATION = os.getenv("KOKORO_GRAPH_OPTIMIZATION", "all")  # disable, basic, extended, all
+KOKORO_EXECUTION_MODE = os.getenv("KOKORO_EXECUTION_MODE", "sequential")  # sequential, parallel
+
+# Replies with at least this many sentences are synthesized sentence-parallel across the Kokoro sessions
+TTS_PARALLEL_MIN_SENTENCES = int(os.getenv("TTS_PARALLEL_MIN_SENTENCES", 3))
+# Sentences of one request on the TTS executor at a time (0 = one per Kokoro session), the rest wait
+# their turn so a long reply does not hold up the sentences of other requests
+TTS_SENTENCE_LOOKAHEAD = int(os.getenv("TTS_SENTENCE_LOOKAHEAD", 0))
+# Silence inserted between sentences once their own leading/trailing silence is trimmed
+TTS_SENTENCE_GAP_MS = float(os.getenv("TTS_SENTENCE_GAP_MS", 200))
+
+# Admission control: concurrent requests per endpoint, how many may queue, and how long they may wait (seconds)
+ADMISSION_TRANSCRIBE_CONCURRENCY = int(os.getenv("ADMISSION_TRANSCRIBE_CONCURRENCY", 4))
+ADMISSION_TTS_CONCURRENCY = int(os.getenv("ADMISSION_TTS_CONCURRENCY", 4))
+# Voice turns only count while they transcribe or synthesize, not while they wait on the agent
+ADMISSION_VOICE_TURN_CONCURRENCY = int(os.getenv("ADMISSION_VOICE_TURN_CONCURRENCY", 2))
+ADMISSION_STREAM_CONCURRENCY = int(os.getenv("ADMISSION_STREAM_CONCURRENCY", 4))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 16))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
 
-# Load Whisper model
-print("Loading Whisper model...")
-model = whisper.load_model("base")
+# Jana agent service that /voice_turn forwards transcripts to
+AGENT_URL = os.getenv("AGENT_URL", "http://localhost:8000")
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", 300))
 
-# Load Kokoro TTS model
-print("Loading Kokoro TTS model...")
-kokoro = Kokoro("kokoro-v1.0.onnx", "voices.bin")
+# Models are loaded on a background thread (see load_models) so the port opens right away
+engine = None
+small_engine = None
+transcriber = None
+small_transcriber = None
+cascade = None
+kokoro_pool = None
+tts_executor = None
+voice_table = None
+models_ready = threading.Event()
+model_load_error = None
+
+# Worker processes whose models are ready or failed to load. Created before serve.py forks, so the
+# counters are shared by all gunicorn workers; a server started on its own is its single worker
+worker_count = 1
+workers_ready = multiprocessing.Value("i", 0)
+workers_failed = multiprocessing.Value("i", 0)
+
+admission = {
+    name: AdmissionController(name, concurrency, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+    for name, concurrency in [
+        ("transcribe", ADMISSION_TRANSCRIBE_CONCURRENCY),
+        ("tts", ADMISSION_TTS_CONCURRENCY),
+        ("voice_turn", ADMISSION_VOICE_TURN_CONCURRENCY),
+        ("transcribe_stream", ADMISSION_STREAM_CONCURRENCY),
+    ]
+}
+
+# Encoded output per /tts format, to compare bytes per second of audio
+format_stats = {audio_format: {"bytes": 0, "audio_seconds": 0.0} for audio_format in AUDIO_FORMATS}
+format_stats_lock = threading.Lock()
+
+tts_cache = TTSCache(
+    memory_bytes=int(TTS_CACHE_MEMORY_MB * 1024 * 1024),
+    disk_dir=TTS_CACHE_DIR or None,
+    disk_bytes=int(TTS_CACHE_DISK_MB * 1024 * 1024),
+)
 
 # Available voices in the Kokoro model
 available_voices = [
@@ -27,21 +132,468 @@ available_voices = [
     'bm_george', 'bm_lewis'
 ]
 
+
+def warm_up_models():
+    # One dummy inference per model so graph setup and kernel selection are not paid by the first user
+    print("Warming up models...")
+    silence = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+    transcriber.transcribe(silence)
+    if small_transcriber is not None:
+        small_transcriber.transcribe(silence)
+    # Every session pays its own setup cost, so warm each one
+    for index in range(len(kokoro_pool)):
+        with kokoro_pool.acquire(index) as kokoro:
+            kokoro.create("Warming up.", voice=available_voices[0], speed=1.0)
+
+
+def load_engines(threads=0):
+    global engine, small_engine
+    print(f"Loading Whisper model ({WHISPER_BACKEND} backend)...")
+    engine = create_engine(WHISPER_BACKEND, WHISPER_MODEL, threads)
+    if WHISPER_CASCADE and WHISPER_CASCADE_MODEL:
+        print(f"Loading Whisper cascade model ({WHISPER_CASCADE_MODEL})...")
+        small_engine = create_engine(WHISPER_BACKEND, WHISPER_CASCADE_MODEL, threads)
+
+
+def load_shared_models():
+    # Only loads weights, no inference: safe to run in a parent process before forking workers
+    global voice_table
+    # Checked first, so a typo in WHISPER_BACKEND is reported as such
+    if engine_class(WHISPER_BACKEND).fork_safe:
+        load_engines()
+    voice_table = VoiceTable(KOKORO_VOICES_PATH)
+
+
+def kokoro_session_count(threads):
+    # One session per `threads` of this worker's cores, and at least two: with a single session
+    # synthesize_long falls back to serial synthesis
+    if KOKORO_SESSIONS:
+        return KOKORO_SESSIONS
+    cores = max(1, (os.cpu_count() or 1) // worker_count)
+    return max(2, cores // threads) if threads else 2
+
+
+def load_worker_models(intra_op_threads=0):
+    # Everything that owns threads or an ONNX session has to be created in the process that serves requests
+    global transcriber, small_transcriber, cascade, kokoro_pool, tts_executor
+    if engine is None:
+        # Engines that own native thread pools are created after the fork
+        load_engines(intra_op_threads)
+    else:
+        # Loaded before the fork, with the parent's default thread count
+        engine.set_threads(intra_op_threads)
+    transcriber = BatchingTranscriber(
+        engine, window_ms=WHISPER_BATCH_WINDOW_MS, max_batch_size=WHISPER_MAX_BATCH_SIZE
+    ).start()
+    if small_engine is not None:
+        small_transcriber = BatchingTranscriber(
+            small_engine, window_ms=WHISPER_BATCH_WINDOW_MS, max_batch_size=WHISPER_MAX_BATCH_SIZE
+        ).start()
+    cascade = TranscriptionCascade(
+        small_transcriber, transcriber,
+        max_seconds=WHISPER_CASCADE_MAX_SECONDS,
+        min_avg_logprob=WHISPER_CASCADE_MIN_LOGPROB,
+        sample_rate=WHISPER_SAMPLE_RATE,
+    )
+
+    # Load Kokoro TTS model
+    print("Loading Kokoro TTS model...")
+    kokoro_threads = KOKORO_INTRA_OP_THREADS or intra_op_threads
+    kokoro_pool = KokoroPool(
+        KOKORO_MODEL_PATH, KOKORO_VOICES_PATH,
+        # Kokoro's voice archive is swapped for the memory-mapped table, voices are only read when first used
+        voices=voice_table,
+        size=kokoro_session_count(kokoro_threads),
+        intra_op_threads=kokoro_threads,
+        inter_op_threads=KOKORO_INTER_OP_THREADS,
+        graph_optimization=KOKORO_GRAPH_OPTIMIZATION,
+        execution_mode=KOKORO_EXECUTION_MODE,
+    )
+    # One synthesis thread per session, more would only queue on the pool
+    tts_executor = ThreadPoolExecutor(max_workers=len(kokoro_pool), thread_name_prefix="tts")
+
+    warm_up_models()
+    models_ready.set()
+    with workers_ready.get_lock():
+        workers_ready.value += 1
+    print("Models ready.")
+
+
+def load_models(intra_op_threads=0):
+    global model_load_error
+    try:
+        if voice_table is None:
+            # Nothing was loaded before a fork (or there was no fork), load the shared part here
+            load_shared_models()
+        load_worker_models(intra_op_threads)
+    except Exception as e:
+        # The process keeps serving, /readyz and the model endpoints report the error
+        model_load_error = str(e)
+        with workers_failed.get_lock():
+            workers_failed.value += 1
+        print("Error loading models:", model_load_error)
+
+
+def start_model_loading(intra_op_threads=0):
+    threading.Thread(target=load_models, args=(intra_op_threads,), name="model-loader", daemon=True).start()
+
+
+def stop_worker():
+    # A worker that exits no longer counts, gunicorn boots a replacement that loads its models again
+    for counter, counted in ((workers_ready, models_ready.is_set()), (workers_failed, model_load_error is not None)):
+        if counted:
+            with counter.get_lock():
+                counter.value -= 1
+
+
+def worker_stats():
+    return {"total": worker_count, "ready": workers_ready.value, "failed": workers_failed.value}
+
+
+def requires_models(view):
+    # Reject requests with 503 until the models are loaded and warmed up
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not models_ready.is_set():
+            response = jsonify({"error": "Models are still loading" if model_load_error is None else model_load_error})
+            response.headers["Retry-After"] = "5"
+            return response, 503
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def busy_response(rejected):
+    response = jsonify({"error": str(rejected)})
+    response.headers["Retry-After"] = str(rejected.retry_after)
+    return response, 429
+
+
+def admit(name):
+    # Bound concurrent work per endpoint, answer 429 with Retry-After when the queue is full
+    controller = admission[name]
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            admitted_at = controller.acquire()
+            if admitted_at is None:
+                return busy_response(AdmissionRejected(controller))
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                controller.release(admitted_at)
+                raise
+            if response.is_streamed:
+                # Streaming work continues after the view returns, keep the slot until the body is sent
+                response.call_on_close(lambda: controller.release(admitted_at))
+            else:
+                controller.release(admitted_at)
+            return response
+        return wrapper
+    return decorator
+
+
+def synthesize(text_to_speak, speaker_id, speed=1.0):
+    # Repeated phrases are served from the cache without touching the ONNX session
+    cached = tts_cache.get(text_to_speak, speaker_id, speed)
+    if cached is not None:
+        return cached
+    samples, sample_rate = kokoro_pool.create(text_to_speak, voice=speaker_id, speed=speed)
+    tts_cache.put(text_to_speak, speaker_id, speed, samples, sample_rate)
+    return samples, sample_rate
+
+
+class SentenceQueue:
+    """
+    Synthesizes one request's sentences on tts_executor, in order, with at most
+    `lookahead` of them on the executor at once. The next sentence is submitted when
+    one finishes, so it queues behind whatever other requests submitted meanwhile.
+    """
+
+    def __init__(self, speaker_id, speed=1.0, lookahead=None):
+        self._speaker_id = speaker_id
+        self._speed = speed
+        self._lookahead = lookahead or TTS_SENTENCE_LOOKAHEAD or len(kokoro_pool)
+        self._lock = threading.Lock()
+        self._items = deque()  # (sentence, future) not handed out yet, in order
+        self._waiting = deque()  # (sentence, future) not submitted yet
+        self._submitted = []
+        self._running = 0
+
+    def add(self, sentences):
+        with self._lock:
+            for sentence in sentences:
+                item = (sentence, Future())
+                self._items.append(item)
+                self._waiting.append(item)
+        self._submit()
+
+    def synthesizing(self):
+        # Sentences waiting for or running on the executor
+        with self._lock:
+            return bool(self._waiting) or self._running > 0
+
+    def results(self, wait):
+        """
+        Yields (sentence, (samples, sample_rate)) in order, as long as the next one is
+        done, or until all are when `wait` is true.
+        """
+        while self._items and (wait or self._items[0][1].done()):
+            sentence, future = self._items.popleft()
+            yield sentence, future.result()
+
+    def cancel(self):
+        with self._lock:
+            self._waiting.clear()
+            futures = [future for _, future in self._items] + list(self._submitted)
+        # Outside the lock: cancelling a submitted future runs its callback right here
+        for future in futures:
+            future.cancel()
+
+    def _submit(self):
+        while True:
+            with self._lock:
+                if not self._waiting or self._running >= self._lookahead:
+                    return
+                sentence, result = self._waiting.popleft()
+                self._running += 1
+                future = tts_executor.submit(synthesize, sentence, self._speaker_id, self._speed)
+                self._submitted.append(future)
+            # Outside the lock: the callback runs right here if the future is already done
+            future.add_done_callback(functools.partial(self._finished, result))
+
+    def _finished(self, result, future):
+        try:
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(future.result())
+        except InvalidStateError:
+            pass  # Cancelled by the request in the meantime
+        with self._lock:
+            self._running -= 1
+            self._submitted.remove(future)
+        self._submit()
+
+
+def synthesize_sentences(sentences, speaker_id, speed=1.0):
+    # Synthesize ahead on the executor (bounded per request) and yield results in order
+    queue = SentenceQueue(speaker_id, speed)
+    queue.add(sentences)
+    try:
+        for _, result in queue.results(wait=True):
+            yield result
+    finally:
+        queue.cancel()
+
+
+def sentence_gap(sample_rate):
+    return np.zeros(int(sample_rate * TTS_SENTENCE_GAP_MS / 1000), dtype=np.float32)
+
+
+def synthesize_long(text_to_speak, speaker_id, speed=1.0):
+    sentences = split_sentences(text_to_speak)
+    if len(sentences) < TTS_PARALLEL_MIN_SENTENCES or len(kokoro_pool) < 2:
+        return synthesize(text_to_speak, speaker_id, speed)
+
+    pieces = []
+    sample_rate = None
+    for samples, sample_rate in synthesize_sentences(sentences, speaker_id, speed):
+        if pieces:
+            pieces.append(sentence_gap(sample_rate))
+        pieces.append(trim_silence(samples))
+    return np.concatenate(pieces), sample_rate
+
+
+def record_encoded(audio_format, num_bytes, num_samples, sample_rate):
+    with format_stats_lock:
+        format_stats[audio_format]["bytes"] += num_bytes
+        format_stats[audio_format]["audio_seconds"] += num_samples / sample_rate
+
+
+def stream_tts(text_to_speak, speaker_id, speed=1.0, audio_format="wav"):
+    # Sentences are synthesized ahead in parallel, but each chunk goes out as soon as it and its predecessors are ready
+    encoder = None
+    sent_bytes = sent_samples = 0
+    try:
+        for samples, sample_rate in synthesize_sentences(split_sentences(text_to_speak), speaker_id, speed):
+            samples = trim_silence(samples)
+            if encoder is None:
+                encoder = StreamEncoder(audio_format, sample_rate)
+            else:
+                samples = np.concatenate([sentence_gap(sample_rate), samples])
+            chunk = encoder.write(samples)
+            sent_bytes += len(chunk)
+            sent_samples += len(samples)
+            if chunk:
+                yield chunk
+        if encoder is not None:
+            chunk = encoder.close()
+            sent_bytes += len(chunk)
+            record_encoded(audio_format, sent_bytes, sent_samples, encoder.sample_rate)
+            if chunk:
+                yield chunk
+    except Exception as e:
+        # Headers are already out, so the best we can do is end the stream early
+        print("Error in streaming TTS generation:", str(e))
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving HTTP
+    return jsonify({"status": "ok"})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: models are loaded and warmed up
+    if models_ready.is_set():
+        return jsonify({"status": "ready"})
+    if model_load_error is not None:
+        return jsonify({"status": "failed", "error": model_load_error}), 503
+    return jsonify({"status": "loading"}), 503
+
+
 @app.route('/transcribe', methods=['POST'])
+@requires_models
+@admit("transcribe")
 def transcribe():
     if 'audio' not in request.files:
         return jsonify({"error": "No audio file provided"}), 400
 
     audio_file = request.files['audio']
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        audio_file.save(tmp.name)
-        transcription = model.transcribe(tmp.name)
-        os.unlink(tmp.name)  # Clean up the temp file
+    try:
+        audio = decode_audio(audio_file.read())
+    except AudioDecoderMissing as e:
+        print("Error decoding audio:", str(e))
+        return jsonify({"error": str(e)}), 415
+    except RuntimeError as e:
+        print("Error decoding audio:", str(e))
+        return jsonify({"error": "Could not decode audio file"}), 400
+
+    try:
+        transcription = cascade.transcribe(audio)
+    except Exception as e:
+        print("Error in transcription:", str(e))
+        return jsonify({"error": str(e)}), 500
 
     return jsonify({"transcription": transcription["text"]})
 
 
+@sock.route('/transcribe/stream')
+def transcribe_stream(ws):
+    # Client sends binary PCM16 mono frames (16 kHz unless ?sample_rate= says otherwise)
+    # and a text "end" message when done. Server answers with JSON partial/final transcripts.
+    if not models_ready.is_set():
+        ws.send(json.dumps({"type": "error", "error": "Models are still loading"}))
+        return
+    admitted_at = admission["transcribe_stream"].acquire()
+    if admitted_at is None:
+        ws.send(json.dumps({"type": "error", "error": "Server busy, too many transcription streams",
+                            "retry_after": admission["transcribe_stream"].retry_after()}))
+        return
+    try:
+        run_transcribe_stream(ws)
+    finally:
+        admission["transcribe_stream"].release(admitted_at)
+
+
+def run_transcribe_stream(ws):
+    input_rate = int(request.args.get('sample_rate', WHISPER_SAMPLE_RATE))
+    segmenter = SpeechSegmenter(
+        sample_rate=WHISPER_SAMPLE_RATE,
+        silence_ms=int(request.args.get('silence_ms', 600)),
+        partial_interval_ms=int(request.args.get('partial_interval_ms', 1000)),
+    )
+    # One resampler for the whole stream, so the filter and the sample positions run across messages
+    resampler = StreamResampler(input_rate, WHISPER_SAMPLE_RATE)
+    segment_index = 0
+
+    def handle(events):
+        nonlocal segment_index
+        for event in events:
+            if event[0] == "partial":
+                # Partials are re-transcribed every interval, keep them out of the cascade stats
+                result = cascade.transcribe(event[1], record_stats=False)
+                ws.send(json.dumps({"type": "partial", "segment": segment_index, "text": result["text"].strip()}))
+            else:
+                _, audio, start, end = event
+                result = cascade.transcribe(audio)
+                ws.send(json.dumps({
+                    "type": "final", "segment": segment_index, "text": result["text"].strip(),
+                    "start": round(start, 3), "end": round(end, 3),
+                }))
+                segment_index += 1
+
+    try:
+        while True:
+            message = ws.receive()
+            if isinstance(message, str):
+                break
+            samples = pcm16_to_float(message)
+            handle(segmenter.feed(resampler.feed(samples)))
+
+        # Text message ends the stream, transcribe whatever is still open
+        handle(segmenter.feed(resampler.flush()))
+        handle(segmenter.flush())
+        ws.send(json.dumps({"type": "end", "segments": segment_index}))
+    except ConnectionClosed:
+        print("Transcription stream closed by client")
+
+
+def tts_format_stats():
+    with format_stats_lock:
+        return {
+            audio_format: dict(
+                stats,
+                bytes_per_second=stats["bytes"] / stats["audio_seconds"] if stats["audio_seconds"] else 0.0,
+            )
+            for audio_format, stats in format_stats.items()
+        }
+
+
+def process_stats():
+    rss_mb = pss_mb = None  # No procfs (macOS dev machines)
+    try:
+        with open("/proc/self/statm") as f:
+            rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        # RSS counts the weights shared with the other workers in full in every worker, PSS splits
+        # shared pages between the processes mapping them, so it can be summed across workers
+        with open("/proc/self/smaps_rollup") as f:
+            pss_mb = next(int(line.split()[1]) / 1024 for line in f if line.startswith("Pss:"))
+    except (OSError, StopIteration):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "pid": os.getpid(),
+        "rss_mb": rss_mb,
+        "pss_mb": pss_mb,
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        "peak_rss_mb": peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024,
+    }
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        "process": process_stats(),
+        # /readyz only answers for the worker that took the request, this covers all of them
+        "workers": worker_stats(),
+        "transcription": transcriber.stats() if transcriber else None,
+        "transcription_small": small_transcriber.stats() if small_transcriber else None,
+        "cascade": cascade.stats() if cascade else None,
+        "tts_cache": tts_cache.stats(),
+        "voices": voice_table.stats() if voice_table else None,
+        "kokoro_sessions": kokoro_pool.stats() if kokoro_pool else None,
+        "tts_formats": tts_format_stats(),
+        "admission": {name: controller.stats() for name, controller in admission.items()},
+    })
+
+
 @app.route('/tts', methods=['POST'])
+@requires_models
+@admit("tts")
 def tts():
     data = request.get_json()
     print("Received /tts request:", data)  # Debugging log
@@ -52,6 +604,12 @@ def tts():
     
     text_to_speak = data['text']
     speaker_id = data.get('speaker_id', 'af_bella')  # Default speaker
+    stream = bool(data.get('stream', False))
+    audio_format = data.get('format', 'wav')
+
+    if audio_format not in AUDIO_FORMATS:
+        print(f"Error: Invalid format: {audio_format}")
+        return jsonify({'error': f'Invalid format. Available formats: {list(AUDIO_FORMATS)}'}), 400
 
     if speaker_id not in available_voices:
         print(f"Error: Invalid speaker_id: {speaker_id}")
@@ -59,25 +617,178 @@ def tts():
 
     print(f"Generating TTS for: {text_to_speak} | Voice: {speaker_id}")
 
+    mimetype = AUDIO_FORMATS[audio_format]["mimetype"]
+    if stream:
+        return Response(stream_with_context(stream_tts(text_to_speak, speaker_id, audio_format=audio_format)),
+                        mimetype=mimetype)
+
     try:
-        samples, sample_rate = kokoro.create(text_to_speak, voice=speaker_id, speed=1.0)
+        samples, sample_rate = synthesize_long(text_to_speak, speaker_id)
+        audio_data = encode_audio(samples, sample_rate, audio_format)
+        record_encoded(audio_format, len(audio_data), len(samples), sample_rate)
+        return Response(audio_data, mimetype=mimetype)
+
+    except Exception as e:
+        print("Error in TTS generation:", str(e))
+        return jsonify({'error': str(e)}), 500
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_wav:
-            sf.write(tmp_wav.name, samples, sample_rate)
-            audio_path = tmp_wav.name
+def agent_events(transcription, history):
+    # Server-Sent Events from the agent's /run_task_stream, one dict per event
+    with requests.post(
+        f"{AGENT_URL}/run_task_stream", json={"task": transcription, "history": history},
+        stream=True, timeout=AGENT_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                yield json.loads(line[len("data:"):])
 
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
 
-        os.unlink(audio_path)
-        return Response(audio_data, mimetype='audio/wav')
+def voice_turn_events(audio, history, speaker_id, audio_format, slot):
+    # `slot` is the voice_turn admission slot, held for transcription and synthesis only:
+    # waiting on the agent is I/O and should not keep other voice turns out
+    def event(payload):
+        return json.dumps(payload) + "\n"
 
+    try:
+        transcription = cascade.transcribe(audio)["text"].strip()
+    except Exception as e:
+        print("Error in transcription:", str(e))
+        yield event({"type": "error", "stage": "transcribe", "error": str(e)})
+        return
+    finally:
+        slot.release()
+    # Sent before the agent runs so the client can show the user's words right away
+    yield event({"type": "transcript", "text": transcription})
+
+    # Each sentence is synthesized as soon as the agent has streamed it, and sent once it and
+    # the ones before it are done and its model turn ended without tool calls: text the model
+    # writes before calling a tool is not part of the reply, its audio is dropped unsent
+    sentences = SentenceBuffer()
+    pending = SentenceQueue(speaker_id)
+    reply_turn = False
+    sent = 0
+
+    def speak(new_sentences):
+        if new_sentences:
+            slot.acquire()
+            pending.add(new_sentences)
+
+    def ready_audio(wait):
+        nonlocal sent
+        # Held back while the turn may still end in tool calls
+        results = pending.results(wait) if reply_turn else ()
+        for sentence, (samples, sample_rate) in results:
+            samples = trim_silence(samples)
+            if sent:
+                samples = np.concatenate([sentence_gap(sample_rate), samples])
+            audio_data = encode_audio(samples, sample_rate, audio_format)
+            record_encoded(audio_format, len(audio_data), len(samples), sample_rate)
+            yield event({
+                "type": "audio", "index": sent, "text": sentence, "format": audio_format,
+                "audio": base64.b64encode(audio_data).decode("ascii"),
+            })
+            sent += 1
+        if not pending.synthesizing():
+            # Nothing left to synthesize until the agent streams more sentences
+            slot.release()
+
+    try:
+        reply = None
+        try:
+            for agent_event in agent_events(transcription, history):
+                if agent_event["type"] == "error":
+                    yield event({"type": "error", "stage": "agent", "error": agent_event["error"]})
+                    return
+                if agent_event["type"] == "final":
+                    reply = agent_event["text"]
+                    break
+                if agent_event["type"] == "token":
+                    speak(sentences.feed(agent_event["text"]))
+                elif agent_event["type"] == "turn_end":
+                    if agent_event["tool_calls"]:
+                        pending.cancel()
+                        pending = SentenceQueue(speaker_id)
+                        sentences = SentenceBuffer()
+                    else:
+                        speak(sentences.flush())
+                        reply_turn = True
+                # token, turn_end, tool_start and tool_end are passed through so the client can show progress
+                yield event(agent_event)
+                yield from ready_audio(wait=False)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print("Error calling agent:", str(e))
+            yield event({"type": "error", "stage": "agent", "error": str(e)})
+            return
+        if reply is None:
+            yield event({"type": "error", "stage": "agent", "error": "Agent stream ended without a reply"})
+            return
+        yield event({"type": "reply", "text": reply})
+
+        if not reply_turn:
+            # No turn ended without tool calls in the stream, speak the reply as a whole
+            pending.cancel()
+            pending = SentenceQueue(speaker_id)
+            reply_turn = True
+            speak(split_sentences(reply))
+        yield from ready_audio(wait=True)
+    except AdmissionRejected as e:
+        yield event({"type": "error", "stage": "tts", "error": str(e), "retry_after": e.retry_after})
+        return
     except Exception as e:
         print("Error in TTS generation:", str(e))
-        return jsonify({'error': str(e)}), 500
+        yield event({"type": "error", "stage": "tts", "error": str(e)})
+        return
+    finally:
+        pending.cancel()
+        slot.release()
+    yield event({"type": "done", "sentences": sent})
+
+
+@app.route('/voice_turn', methods=['POST'])
+@requires_models
+def voice_turn():
+    # One round trip for a whole voice turn: audio in, then newline-delimited JSON events out
+    # (transcript, agent progress, one playable audio clip per sentence as the reply streams in,
+    # the full reply, done)
+    if 'audio' not in request.files:
+        return jsonify({"error": "No audio file provided"}), 400
+
+    speaker_id = request.form.get('speaker_id', 'af_bella')
+    audio_format = request.form.get('format', 'wav')
+    if speaker_id not in available_voices:
+        return jsonify({'error': f'Invalid speaker_id. Available voices: {available_voices}'}), 400
+    if audio_format not in AUDIO_FORMATS:
+        return jsonify({'error': f'Invalid format. Available formats: {list(AUDIO_FORMATS)}'}), 400
+    try:
+        history = json.loads(request.form.get('history', '[]'))
+    except ValueError:
+        return jsonify({"error": "history must be a JSON list of {sender, content} messages"}), 400
+
+    try:
+        audio = decode_audio(request.files['audio'].read())
+    except AudioDecoderMissing as e:
+        print("Error decoding audio:", str(e))
+        return jsonify({"error": str(e)}), 415
+    except RuntimeError as e:
+        print("Error decoding audio:", str(e))
+        return jsonify({"error": "Could not decode audio file"}), 400
+
+    # Admitted for the transcription here, voice_turn_events releases the slot while the agent runs
+    slot = AdmissionSlot(admission["voice_turn"])
+    try:
+        slot.acquire()
+    except AdmissionRejected as e:
+        return busy_response(e)
+    response = Response(stream_with_context(voice_turn_events(audio, history, speaker_id, audio_format, slot)),
+                        mimetype='application/x-ndjson')
+    # In case the body is never read
+    response.call_on_close(slot.release)
+    return response
 
 # This is a test push to see if I nuked the repo after supposedly fixing the issue
 # It did not even give me the prompt it just went ahead and did it
 
 if __name__ == '__main__':
+    start_model_loading()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import audio_io
+from audio_io import AudioDecoderMissing, StreamResampler, decode_audio, encode_audio, resample
+
+
+def tone(frequency, sample_rate, seconds=1.0):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return np.sin(2 * np.pi * frequency * t).astype(np.float32)
+
+
+def rms(samples):
+    # Edges left out, where the filter runs into the end of the signal
+    middle = samples[len(samples) // 10: -len(samples) // 10]
+    return float(np.sqrt(np.mean(middle ** 2)))
+
+
+def test_resample_keeps_the_speech_band():
+    out = resample(tone(1000, 44100), 44100, 16000)
+
+    assert len(out) == 16000
+    assert rms(out) == pytest.approx(rms(tone(1000, 16000)), rel=0.05)
+
+
+def test_resample_removes_what_would_alias():
+    # 12 kHz is above the 8 kHz Nyquist frequency of 16 kHz audio and would fold back to 4 kHz
+    out = resample(tone(12000, 44100), 44100, 16000)
+
+    assert rms(out) < 0.01 * rms(tone(1000, 16000))
+
+
+def test_resample_integer_ratio():
+    out = resample(tone(1000, 48000), 48000, 16000)
+
+    assert len(out) == 16000
+    assert rms(out) == pytest.approx(rms(tone(1000, 16000)), rel=0.05)
+
+
+def test_decode_wav_resamples_to_16k():
+    audio = decode_audio(encode_audio(tone(440, 22050) * 0.5, 22050, "wav"))
+
+    assert audio.dtype == np.float32
+    assert len(audio) == 16000
+
+
+def test_missing_ffmpeg_is_reported(monkeypatch):
+    def run(*args, **kwargs):
+        raise FileNotFoundError("ffmpeg")
+
+    monkeypatch.setattr(audio_io.subprocess, "run", run)
+    with pytest.raises(AudioDecoderMissing):
+        decode_audio(b"\x1aE\xdf\xa3 not something libsndfile reads")
+
+
+@pytest.mark.parametrize("orig_sr", [44100, 48000, 22050, 8000])
+def test_chunked_resampling_matches_one_shot(orig_sr):
+    # Two tones and a click, so timing shifts and edge effects at chunk boundaries would show
+    signal = 0.5 * tone(440, orig_sr, 2.0) + 0.2 * tone(3000, orig_sr, 2.0)
+    signal[orig_sr // 3] = 1.0
+    whole = resample(signal, orig_sr, 16000)
+
+    resampler = StreamResampler(orig_sr, 16000)
+    chunks = [resampler.feed(signal[start:start + 4096]) for start in range(0, len(signal), 4096)]
+    chunked = np.concatenate(chunks + [resampler.flush()])
+
+    assert len(chunked) == len(whole) == 32000
+    assert np.max(np.abs(chunked - whole)) < 1e-5
@@ -0,0 +1,58 @@
+import numpy as np
+
+from cascade import TranscriptionCascade
+
+
+class FakeTier:
+    def __init__(self, name, avg_logprob):
+        self.name = name
+        self.avg_logprob = avg_logprob
+        self.calls = 0
+
+    def transcribe(self, audio):
+        self.calls += 1
+        return {"text": self.name, "avg_logprob": self.avg_logprob, "no_speech_prob": 0.0}
+
+
+def clip(seconds):
+    return np.zeros(int(seconds * 16000), dtype=np.float32)
+
+
+def test_confident_short_clip_stays_on_the_small_model():
+    small, large = FakeTier("small", -0.2), FakeTier("large", -0.1)
+    result = TranscriptionCascade(small, large).transcribe(clip(2))
+
+    assert result["tier"] == "small"
+    assert large.calls == 0
+
+
+def test_unsure_or_long_clips_go_to_the_large_model():
+    small, large = FakeTier("small", -1.5), FakeTier("large", -0.1)
+    cascade = TranscriptionCascade(small, large, max_seconds=4.0)
+
+    assert cascade.transcribe(clip(2))["tier"] == "large"
+    assert cascade.transcribe(clip(10))["tier"] == "large"
+    assert small.calls == 1
+    assert cascade.stats()["fallbacks"] == 1
+
+
+def test_without_a_small_model_everything_goes_to_the_large_one():
+    large = FakeTier("large", -0.1)
+    cascade = TranscriptionCascade(None, large)
+
+    assert cascade.transcribe(clip(1))["tier"] == "large"
+    assert cascade.stats()["enabled"] is False
+
+
+def test_unrecorded_calls_stay_out_of_the_stats():
+    small, large = FakeTier("small", -1.5), FakeTier("large", -0.1)
+    cascade = TranscriptionCascade(small, large)
+    for _ in range(5):
+        cascade.transcribe(clip(1), record_stats=False)
+    cascade.transcribe(clip(1))
+
+    stats = cascade.stats()
+    assert stats["tiers"]["small"]["requests"] == 1
+    assert stats["tiers"]["large"]["requests"] == 1
+    assert stats["fallbacks"] == 1
+    assert stats["fallback_rate"] == 1.0
@@ -0,0 +1,82 @@
+import numpy as np
+
+from vad import SpeechSegmenter
+
+RATE = 16000
+rng = np.random.default_rng(0)
+
+
+def noise(seconds, level_db):
+    return (rng.standard_normal(int(seconds * RATE)) * 10 ** (level_db / 20)).astype(np.float32)
+
+
+def speech(seconds, level_db=-20.0, background_db=-60.0, pauses=True):
+    # A tone in 200 ms syllables with 100 ms pauses (or held throughout), over the background noise
+    t = np.arange(int(seconds * RATE)) / RATE
+    syllables = (t % 0.3) < 0.2 if pauses else np.ones(len(t), dtype=bool)
+    tone = np.sin(2 * np.pi * 220 * t) * np.sqrt(2) * 10 ** (level_db / 20) * syllables
+    return (tone + noise(seconds, background_db)).astype(np.float32)
+
+
+def run(segmenter, audio, chunk=480):
+    events = []
+    for start in range(0, len(audio), chunk):
+        events.extend(segmenter.feed(audio[start:start + chunk]))
+    return events + segmenter.flush()
+
+
+def finals(events):
+    return [event for event in events if event[0] == "final"]
+
+
+def test_speech_at_stream_start_is_detected():
+    audio = np.concatenate([speech(1.5), noise(1.0, -60)])
+    segments = finals(run(SpeechSegmenter(sample_rate=RATE), audio))
+
+    assert len(segments) == 1
+    _, _, start, end = segments[0]
+    assert start < 0.1
+    assert 1.4 < end < 2.3
+
+
+def test_held_sound_from_the_first_frame_is_detected():
+    # No quiet frame to learn the background from before the speech
+    audio = np.concatenate([speech(0.9, pauses=False), noise(1.0, -60)])
+    segments = finals(run(SpeechSegmenter(sample_rate=RATE), audio))
+
+    assert len(segments) == 1
+    assert segments[0][2] == 0.0
+
+
+def test_silence_gives_no_segments():
+    assert finals(run(SpeechSegmenter(sample_rate=RATE), noise(3.0, -60))) == []
+
+
+def test_noise_floor_follows_a_loud_background():
+    # Steady noise well above the initial floor, then speech above that noise
+    audio = np.concatenate([noise(3.0, -40), speech(1.5, -15, background_db=-40), noise(2.0, -40)])
+    segments = finals(run(SpeechSegmenter(sample_rate=RATE), audio))
+
+    # Only the first second can be taken for speech, before the floor has adapted
+    speech_segments = [s for s in segments if s[2] > 2.0]
+    assert len(speech_segments) == 1
+    _, _, start, end = speech_segments[0]
+    assert 2.6 < start < 3.2
+    assert 4.3 < end < 5.3
+
+
+def test_segments_are_split_on_silence():
+    audio = np.concatenate([speech(1.0), noise(1.0, -60), speech(1.0), noise(1.0, -60)])
+    segments = finals(run(SpeechSegmenter(sample_rate=RATE), audio))
+
+    assert len(segments) == 2
+    assert segments[1][2] > segments[0][3]
+
+
+def test_partials_are_capped_to_the_window():
+    segmenter = SpeechSegmenter(sample_rate=RATE, max_segment_s=30.0, partial_interval_ms=1000, partial_window_s=2.0)
+    partials = [event[1] for event in run(segmenter, speech(10.0)) if event[0] == "partial"]
+
+    assert len(partials) >= 8
+    assert max(len(samples) for samples in partials) <= 2.0 * RATE
+    assert len(partials[-1]) == len(partials[-2])
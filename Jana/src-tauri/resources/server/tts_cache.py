@@ -0,0 +1,182 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Writes between two scans of the disk directory, see TTSCache
+DISK_RESCAN_WRITES = 32
+
+
+def normalize_text(text):
+    # Only collapse whitespace: case and punctuation change how Kokoro speaks the text
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(text, speaker_id, speed):
+    raw = f"{speaker_id}\0{speed:.3f}\0{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized samples, keyed by (text, speaker_id, speed).
+
+    Entries live in an in-memory LRU bounded by `memory_bytes`. Entries evicted from
+    memory stay on disk under `disk_dir` (bounded by `disk_bytes`, least recently
+    used files removed first) and are promoted back to memory on a disk hit.
+
+    Several worker processes can share one `disk_dir`. Each only counts its own
+    writes, so the directory is scanned again every DISK_RESCAN_WRITES writes (and
+    before every eviction) to pick up the others'; between scans the directory can
+    go over `disk_bytes` by what the other workers wrote in the meantime.
+    """
+
+    def __init__(self, memory_bytes, disk_dir=None, disk_bytes=0):
+        self._memory_bytes = memory_bytes
+        self._disk_dir = disk_dir
+        self._disk_bytes = disk_bytes
+        self._entries = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._disk_writes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        if self._disk_dir:
+            os.makedirs(self._disk_dir, exist_ok=True)
+            self._disk_used = sum(size for _, size, _ in self._disk_files())
+
+    def get(self, text, speaker_id, speed):
+        """
+        Looks up previously synthesized audio.
+
+        :return: (samples, sample_rate) on a hit, None on a miss
+        """
+        key = cache_key(text, speaker_id, speed)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._insert_memory(key, entry)
+        return entry
+
+    def put(self, text, speaker_id, speed, samples, sample_rate):
+        key = cache_key(text, speaker_id, speed)
+        entry = (np.asarray(samples, dtype=np.float32), sample_rate)
+        with self._lock:
+            self._insert_memory(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats.update({
+                "hit_rate": (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._memory_used,
+                "memory_budget_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_used,
+                "disk_budget_bytes": self._disk_bytes if self._disk_dir else 0,
+            })
+            return stats
+
+    def _insert_memory(self, key, entry):
+        size = entry[0].nbytes
+        if size > self._memory_bytes:
+            return
+        if key in self._entries:
+            self._memory_used -= self._entries.pop(key)[0].nbytes
+        self._entries[key] = entry
+        self._memory_used += size
+        while self._memory_used > self._memory_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._memory_used -= evicted.nbytes
+            self._stats["memory_evictions"] += 1
+
+    def _path(self, key):
+        return os.path.join(self._disk_dir, f"{key}.npz")
+
+    def _read_disk(self, key):
+        if not self._disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = (data["samples"], int(data["sample_rate"]))
+            os.utime(path)  # Mark as recently used for disk eviction
+            return entry
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self._disk_dir:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        # A unique name per write, threads and worker processes may write the same entry at once
+        fd, tmp_path = tempfile.mkstemp(dir=self._disk_dir, prefix=f"{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, samples=entry[0], sample_rate=entry[1])
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("Error writing TTS cache entry:", str(e))
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._disk_used += os.path.getsize(path)
+            self._disk_writes += 1
+            if self._disk_writes % DISK_RESCAN_WRITES == 0:
+                # Other workers write to the same directory
+                self._disk_used = sum(size for _, size, _ in self._disk_files())
+            if self._disk_used > self._disk_bytes:
+                self._evict_disk()
+
+    def _disk_files(self):
+        files = []
+        for name in os.listdir(self._disk_dir):
+            if name.endswith(".npz"):
+                path = os.path.join(self._disk_dir, name)
+                try:
+                    files.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError:
+                    continue
+        return files
+
+    def _evict_disk(self):
+        files = sorted(self._disk_files())
+        self._disk_used = sum(size for _, size, _ in files)
+        # Trim to 90% of the budget so we do not rescan the directory on every write
+        for _, size, path in files:
+            if self._disk_used <= self._disk_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._disk_used -= size
+            self._stats["disk_evictions"] += 1
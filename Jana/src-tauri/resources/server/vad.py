@@ -0,0 +1,134 @@
+from collections import deque
+
+import numpy as np
+
+
+class SpeechSegmenter:
+    """
+    Energy-based voice activity detection that cuts a PCM stream into utterances.
+
+    Frames are classified as speech when their level is `margin_db` above the noise
+    floor (and above `min_level_db`). The noise floor is the `noise_percentile` of the
+    frame levels over the last `noise_window_ms`; speech has pauses between words, so
+    a low percentile follows the background even while someone talks. Until
+    `noise_min_ms` of audio has been seen it is `initial_noise_floor_db`, a quiet room,
+    so speech right at the start of the stream is detected too (in a louder room the
+    first second can open a segment holding only noise).
+
+    A segment opens after `start_frames` consecutive speech frames, including
+    `preroll_ms` of audio before it, and closes after `silence_ms` without speech or
+    when it reaches `max_segment_s`.
+
+    `feed` returns a list of events:
+        ("partial", samples) - the last `partial_window_s` of the open segment, every
+                               `partial_interval_ms`, so partials cost the same however
+                               long the segment gets
+        ("final", samples, start_s, end_s) - a closed segment
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, margin_db=10.0, min_level_db=-50.0,
+                 start_frames=3, silence_ms=600, min_speech_ms=250, preroll_ms=300,
+                 max_segment_s=25.0, partial_interval_ms=1000, partial_window_s=8.0,
+                 initial_noise_floor_db=-60.0, noise_percentile=10, noise_window_ms=5000, noise_min_ms=1000):
+        self.sample_rate = sample_rate
+        self._frame_len = sample_rate * frame_ms // 1000
+        self._margin_db = margin_db
+        self._min_level_db = min_level_db
+        self._start_frames = start_frames
+        self._silence_frames = max(1, silence_ms // frame_ms)
+        self._min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self._max_segment_frames = int(max_segment_s * 1000 // frame_ms)
+        self._partial_frames = max(1, partial_interval_ms // frame_ms) if partial_interval_ms else 0
+        self._partial_window_frames = max(1, int(partial_window_s * 1000 // frame_ms))
+        self._noise_percentile = noise_percentile
+        self._noise_min_frames = max(1, noise_min_ms // frame_ms)
+        self._levels = deque(maxlen=max(self._noise_min_frames, noise_window_ms // frame_ms))
+
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._noise_floor_db = initial_noise_floor_db
+        self._speech_run = 0
+        self._segment = None
+        self._segment_start = 0
+        self._speech_frames = 0
+        self._silence_run = 0
+        self._frames_since_partial = 0
+        self._frames_seen = 0
+
+    def _level_db(self, frame):
+        rms = np.sqrt(np.mean(frame.astype(np.float64) ** 2))
+        return 20 * np.log10(max(rms, 1e-10))
+
+    def _is_speech(self, level):
+        self._levels.append(level)
+        if len(self._levels) >= self._noise_min_frames:
+            self._noise_floor_db = float(np.percentile(self._levels, self._noise_percentile))
+        return level > max(self._noise_floor_db + self._margin_db, self._min_level_db)
+
+    def _close(self):
+        frames, self._segment = self._segment, None
+        self._speech_run = 0
+        if self._speech_frames < self._min_speech_frames:
+            return []
+        audio = np.concatenate(frames)
+        start = self._segment_start / self.sample_rate
+        return [("final", audio, start, start + len(audio) / self.sample_rate)]
+
+    def _process_frame(self, frame):
+        events = []
+        speech = self._is_speech(self._level_db(frame))
+        self._frames_seen += 1
+
+        if self._segment is None:
+            self._preroll.append(frame)
+            self._speech_run = self._speech_run + 1 if speech else 0
+            if self._speech_run >= self._start_frames:
+                self._segment = list(self._preroll)
+                self._segment_start = (self._frames_seen - len(self._segment)) * self._frame_len
+                self._preroll.clear()
+                self._speech_frames = self._speech_run
+                self._silence_run = 0
+                self._frames_since_partial = 0
+            return events
+
+        self._segment.append(frame)
+        self._frames_since_partial += 1
+        if speech:
+            self._speech_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+
+        if self._silence_run >= self._silence_frames or len(self._segment) >= self._max_segment_frames:
+            events.extend(self._close())
+        elif self._partial_frames and self._frames_since_partial >= self._partial_frames:
+            self._frames_since_partial = 0
+            events.append(("partial", np.concatenate(self._segment[-self._partial_window_frames:])))
+        return events
+
+    def feed(self, samples):
+        """
+        Adds float32 samples to the stream.
+
+        :param samples: Mono float32 samples at `sample_rate`
+        :return: List of partial/final events produced by these samples
+        """
+        self._pending = np.concatenate([self._pending, samples.astype(np.float32)])
+        events = []
+        while len(self._pending) >= self._frame_len:
+            frame, self._pending = self._pending[:self._frame_len], self._pending[self._frame_len:]
+            events.extend(self._process_frame(frame))
+        return events
+
+    def flush(self):
+        """
+        Closes the open segment at the end of the stream.
+
+        :return: List with the final event of the open segment, if any
+        """
+        if self._segment is None:
+            return []
+        if len(self._pending):
+            self._segment.append(self._pending)
+            self._pending = np.zeros(0, dtype=np.float32)
+        return self._close()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import threading
+import zipfile
+
+import numpy as np
+
+
+class VoiceTable:
+    """
+    Read-only view of Kokoro's voices.bin that materializes one voice at a time.
+
+    voices.bin is an .npz archive, which cannot be memory-mapped directly. The first
+    time a voice is requested its member is extracted once to `cache_dir` as a plain
+    .npy file and opened with mmap_mode="r", so every worker on the box shares the
+    same page-cache pages and voices nobody uses are never read.
+
+    Implements the mapping interface Kokoro uses for its `voices` attribute.
+    """
+
+    def __init__(self, voices_path, cache_dir=None):
+        self._voices_path = voices_path
+        self._cache_dir = cache_dir or f"{voices_path}.d"
+        self._lock = threading.Lock()
+        self._loaded = {}
+        with zipfile.ZipFile(voices_path) as archive:
+            self._names = sorted(
+                name[:-len(".npy")] for name in archive.namelist() if name.endswith(".npy")
+            )
+
+    def keys(self):
+        return list(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __getitem__(self, name):
+        voice = self._loaded.get(name)
+        if voice is not None:
+            return voice
+        if name not in self._names:
+            raise KeyError(f"Unknown voice: {name}")
+        with self._lock:
+            voice = self._loaded.get(name)
+            if voice is None:
+                voice = np.load(self._extract(name), mmap_mode="r")
+                self._loaded[name] = voice
+        return voice
+
+    def stats(self):
+        return {
+            "available": len(self._names),
+            "materialized": sorted(self._loaded),
+            "mapped_bytes": sum(voice.nbytes for voice in self._loaded.values()),
+        }
+
+    def _extract(self, name):
+        path = os.path.join(self._cache_dir, f"{name}.npy")
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(self._voices_path):
+            return path
+        os.makedirs(self._cache_dir, exist_ok=True)
+        # Extract to a private name first: other workers may be extracting the same voice
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with zipfile.ZipFile(self._voices_path) as archive, archive.open(f"{name}.npy") as src, \
+                open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, path)
+        return path